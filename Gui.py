@@ -1,26 +1,36 @@
 import tkinter as tk
 from tkinter import messagebox, simpledialog
 import threading
-import copy
+import queue
 import random
-from PIL import Image, ImageTk
 
 
-from MiniMax import find_best_move_with_alpha_beta, find_best_move_minimax, POTENTIAL_WIN_SCORES
-
 BOARD_SIZE = 15
 WIN_LENGTH = 5
 sizeofceil = 35
-
-def check_win(board, player):
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            if all(col + i < BOARD_SIZE and board[row][col + i] == player for i in range(WIN_LENGTH)) or \
-               all(row + i < BOARD_SIZE and board[row + i][col] == player for i in range(WIN_LENGTH)) or \
-               all(row + i < BOARD_SIZE and col + i < BOARD_SIZE and board[row + i][col + i] == player for i in range(WIN_LENGTH)) or \
-               all(row + i < BOARD_SIZE and col - i >= 0 and board[row + i][col - i] == player for i in range(WIN_LENGTH)):
-                return True
-    return False
+# Predicted human replies the AI searches ahead of time while the human thinks
+PONDER_REPLIES = 3
+MCTS_TIME_LIMIT_MS = 2000
+# How often the Tk loop drains the search threads' event queue
+POLL_MS = 50
+# Pause between moves in AI vs AI games
+AI_VS_AI_DELAY_MS = 700
+
+# The search modules import NumPy and build tables, so they are loaded after
+# the window is up; see load_search_modules
+check_win_from = CancelToken = Engine = BitBoard = book_move = MCTSEngine = None
+Solver = solve_for_move = can_solve = SOLVER_MIN_DIFFICULTY = should_use_book = None
+
+
+def load_search_modules():
+    global check_win_from, CancelToken, Engine, BitBoard, book_move, MCTSEngine
+    global Solver, solve_for_move, can_solve, SOLVER_MIN_DIFFICULTY, should_use_book
+    from MiniMax import check_win_from, CancelToken, Engine
+    from bitboard import BitBoard
+    from opening_book import book_move
+    from mcts import MCTSEngine
+    from solver import Solver, solve_for_move, can_solve
+    from difficulty import SOLVER_MIN_DIFFICULTY, should_use_book
 
 class GomokuGUI:
     def __init__(self, root):
@@ -28,79 +38,134 @@ class GomokuGUI:
         self.root.title("Gomoku Game")
         self.board = [['.' for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
         self.current_player = 'X'
+        self.last_move = None
         self.game_mode = None
         self.ai_difficulty = 3
         self.ai_thinking = False
+        # Bumped on reset; a search only has its move applied if the game it
+        # started in is still the current one
+        self.generation = 0
+        self.search_cancel = None
+        self.ponder_cancel = None
+        self.ponder_thread = None
+        # AI answers to predicted human replies, {reply: move}
+        self.ponder_results = {}
+        # Search threads never touch Tk or the board; they post
+        # ('progress' | 'move', generation, ...) here for the Tk loop
+        self.events = queue.Queue()
+        # Search engine of each AI player; they keep their caches until reset
+        self.engines = {}
+        # Endgame solver of each AI player, keeping its memo until reset
+        self.solvers = {}
+        # Canvas items of the stones, by cell, and the marker of the AI's best move so far
+        self.pieces = {}
         self.canvas = tk.Canvas(root, width=sizeofceil * BOARD_SIZE, height=sizeofceil * BOARD_SIZE, bg='#EAEAEA')
         self.canvas.pack()
+        self.status = tk.StringVar(value="Loading engines...")
+        self.status_label = tk.Label(root, textvariable=self.status, anchor='w')
+        self.status_label.pack(fill=tk.X, padx=10)
         self.reset_button = tk.Button(root, text="Reset", command=self.reset_board)
-        self.exit_button = tk.Button(root, text="Exit", command=root.quit)
+        self.move_now_button = tk.Button(root, text="Move now", command=self.move_now, state=tk.DISABLED)
+        self.exit_button = tk.Button(root, text="Exit", command=self.exit_game)
         self.reset_button.pack(side=tk.LEFT, padx=20, pady=10)
+        self.move_now_button.pack(side=tk.LEFT, padx=20, pady=10)
         self.exit_button.pack(side=tk.RIGHT, padx=20, pady=10)
         self.canvas.bind("<Button-1>", self.handle_click)
         self.drawboard()
+        self.hint = self.canvas.create_oval(0, 0, 0, 0, outline='gray', dash=(2, 2), width=2, state=tk.HIDDEN)
+        # Let the window show before the engines load
+        self.root.after(50, self.start)
+
+    def start(self):
+        load_search_modules()
+        self.engines = {player: Engine(BOARD_SIZE, WIN_LENGTH, player, 'alphabeta', 3) for player in ('X', 'O')}
+        self.solvers = {player: Solver(BOARD_SIZE, WIN_LENGTH) for player in ('X', 'O')}
+        self.status.set("")
+        self.poll_events()
         self.gamemode()
 
     def gamemode(self):
-        mode = simpledialog.askstring("game Mode", "Enter mode:\n1 - human vs human\n2 - human vs AI\n3 - AI vs AI")
+        mode = simpledialog.askstring("game Mode", "Enter mode:\n1 - human vs human\n2 - human vs AI\n3 - AI vs AI\n4 - human vs AI (MCTS)")
         if mode == '1':
             self.game_mode = 1
         elif mode == '2':
             self.game_mode = 2
         elif mode == '3':
             self.game_mode = 3
+            # Alpha-beta (X) against plain minimax (O)
+            self.engines['O'] = Engine(BOARD_SIZE, WIN_LENGTH, 'O', 'minimax', 3)
             self.start_ai_vs_ai()
+        elif mode == '4':
+            self.game_mode = 4
+            self.engines['O'] = MCTSEngine(BOARD_SIZE, WIN_LENGTH, 'O', MCTS_TIME_LIMIT_MS)
         else:
             messagebox.showinfo("info", "invalid mode selected")
             self.game_mode = 1
 
     def start_ai_vs_ai(self):
         self.ai_thinking = True
-        threading.Thread(target=self.ai_vs_ai_thread, daemon=True).start()
-
-    def ai_vs_ai_thread(self):
-        while True:
-            if self.is_terminal(self.board):
-                winner = None
-                if check_win(self.board, 'X'):
-                    winner = 'X'
-                elif check_win(self.board, 'O'):
-                    winner = 'O'
-
-                if winner:
-                    self.root.after(0, lambda: messagebox.showinfo("game Over", f"Player {winner} win"))
+        self.start_search(self.generation)
+
+    def new_search(self):
+        # Cancel token for the next search; any search still running is stale
+        self.cancel_search()
+        self.search_cancel = CancelToken()
+        return self.search_cancel
+
+    def cancel_search(self):
+        if self.search_cancel is not None:
+            self.search_cancel.cancel()
+            self.search_cancel = None
+
+    def move_now(self):
+        # The search stops and plays the best move it has found so far
+        if self.search_cancel is not None:
+            self.search_cancel.cancel()
+
+    def poll_events(self):
+        try:
+            while True:
+                kind, generation, *data = self.events.get_nowait()
+                if generation != self.generation:
+                    continue
+                if kind == 'progress':
+                    self.show_progress(*data)
                 else:
-                    self.root.after(0, lambda: messagebox.showinfo("try again", "It's a draw!"))
+                    self.finish_ai_move(data[0], generation)
+        except queue.Empty:
+            pass
+        self.root.after(POLL_MS, self.poll_events)
+
+    def show_progress(self, player, depth, move, nodes, seconds):
+        rate = nodes / seconds if seconds > 0 else 0
+        unit = "playouts" if self.engines[player].algorithm == 'mcts' else "nodes"
+        self.status.set(f"AI ({player}) thinking: depth {depth}, best {move}, {rate:,.0f} {unit}/s")
+        if move is not None:
+            x1, y1, x2, y2 = self.cell_box(*move)
+            self.canvas.coords(self.hint, x1, y1, x2, y2)
+            self.canvas.itemconfigure(self.hint, state=tk.NORMAL)
+
+    def start_search(self, generation):
+        # Runs on the Tk thread; the search runs in a thread and posts its move
+        if generation != self.generation:
+            return
+        player = self.current_player
+        board_copy = BitBoard.from_list(self.board, WIN_LENGTH).to_list()
+        cancel = self.new_search()
+        self.move_now_button.config(state=tk.NORMAL)
 
-                self.ai_thinking = False
-                self.canvas.unbind("<Button-1>")
-                break
-
-            board_copy = copy.deepcopy(self.board)
-            if self.current_player == 'X':
-                move = find_best_move_with_alpha_beta(
-                    board_copy, BOARD_SIZE,
-                    lambda b: [(i, j) for i in range(BOARD_SIZE) for j in range(BOARD_SIZE) if b[i][j] == '.'],
-                    self.is_terminal, check_win, 3
-                )
-            else:
-                move = find_best_move_minimax(
-                    board_copy, BOARD_SIZE,
-                    lambda b: [(i, j) for i in range(BOARD_SIZE) for j in range(BOARD_SIZE) if b[i][j] == '.'],
-                    self.is_terminal, check_win, 3
-                )
-
-            if move:
-                row, col = move
-                self.board[row][col] = self.current_player
-                self.root.after(0, self.draw_piece, row, col, self.current_player)
+        def progress(depth, move, nodes, seconds):
+            self.events.put(('progress', generation, player, depth, move, nodes, seconds))
 
-            self.switch_player()
-            threading.Event().wait(0.7)
+        def run_ai():
+            move = self.search_move(board_copy, player, cancel, progress)
+            self.events.put(('move', generation, move))
+
+        threading.Thread(target=run_ai, daemon=True).start()
 
 
     def drawboard(self):
-        self.canvas.delete("all")
+        # The grid is drawn once; stones are added and removed one by one
         for i in range(BOARD_SIZE):
 
             self.canvas.create_line(sizeofceil // 2, sizeofceil // 2 + i * sizeofceil,
@@ -115,20 +180,20 @@ class GomokuGUI:
                 if self.board[row][col] != '.':
                     self.draw_piece(row, col, self.board[row][col])
 
-    def draw_piece(self, row, col, player):
+    def cell_box(self, row, col):
         x = sizeofceil // 2 + col * sizeofceil
         y = sizeofceil // 2 + row * sizeofceil
         radius = sizeofceil // 2-2
-        x1 = x - radius
-        y1 = y - radius
-        x2 = x + radius
-        y2 = y + radius
+        return x - radius, y - radius, x + radius, y + radius
+
+    def draw_piece(self, row, col, player):
+        x1, y1, x2, y2 = self.cell_box(row, col)
         color = 'pink' if player == 'X' else 'lavender'
 
-        self.canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline="gray", width=1)
+        self.pieces[(row, col)] = self.canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline="gray", width=1)
 
     def handle_click(self, event):
-        if self.ai_thinking or self.game_mode == 3:
+        if self.ai_thinking or self.game_mode in (None, 3):
             return
 
         col = int((event.x - sizeofceil // 2 ) // sizeofceil)
@@ -136,89 +201,162 @@ class GomokuGUI:
 
         if 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE and self.board[row][col] == '.':
 
-            if self.game_mode == 2 and self.current_player == 'O':
+            if self.game_mode in (2, 4) and self.current_player == 'O':
                 return
 
             self.board[row][col] = self.current_player
+            self.last_move = (row, col)
             self.draw_piece(row, col, self.current_player)
 
-            if self.check_win_local(self.current_player):
-                messagebox.showinfo("game Over", f"Player {self.current_player} win")
-                self.canvas.unbind("<Button-1>")
+            if self.check_win_local(row, col):
+                self.end_game(f"Player {self.current_player} win")
                 return
             elif self.is_draw():
-                messagebox.showinfo("game Over", "it is a draw")
-                self.canvas.unbind("<Button-1>")
+                self.end_game("it is a draw")
                 return
 
             self.switch_player()
 
-            if self.game_mode == 2 and self.current_player == 'O':
+            if self.game_mode in (2, 4) and self.current_player == 'O':
                 self.ai_thinking = True
                 self.root.after(100, self.ai_move_thread)
 
-    def ai_move_thread(self):
-
-        def run_ai():
-            board_copy = copy.deepcopy(self.board)
-            move = find_best_move_minimax(
-                board_copy, BOARD_SIZE,
-                lambda b: [(i, j) for i in range(BOARD_SIZE) for j in range(BOARD_SIZE) if b[i][j] == '.'],
-                self.is_terminal, check_win, 3
-            )
-            if move:
-                row, col = move
-                self.board[row][col] = self.current_player
-
-            self.root.after(0, self.finish_ai_move, move)
-
-        threading.Thread(target=run_ai).start()
+    def search_move(self, board, player, cancel, progress=None):
+        # The AI's engine keeps its transposition table, so work done while
+        # pondering is reused by the next search
+        engine = self.engines[player]
+        move = book_move(board) if should_use_book(self.ai_difficulty, engine.algorithm) else None
+        if move is not None:
+            return move
+        time_limit_ms = engine.time_limit_ms
+        solver = self.solvers[player]
+        if self.ai_difficulty >= SOLVER_MIN_DIFFICULTY and can_solve(board, WIN_LENGTH, solver):
+            _, move, time_limit_ms = solve_for_move(board, player, WIN_LENGTH, time_limit_ms, cancel, solver=solver)
+        return move or engine.best_move(board, time_limit_ms=time_limit_ms, cancel=cancel, progress=progress)
 
-    def finish_ai_move(self, move):
+    def ai_move_thread(self):
+        generation = self.generation
+        self.stop_pondering()
+        # Ponder hit: the human played a reply that was already searched
+        if self.last_move in self.ponder_results:
+            self.finish_ai_move(self.ponder_results[self.last_move], generation)
+            return
+        self.start_search(generation)
+
+    def start_pondering(self):
+        # Search the AI's answers to the likeliest human replies in the background
+        board_copy = BitBoard.from_list(self.board, WIN_LENGTH).to_list()
+        cancel = CancelToken()
+        results = {}
+        self.ponder_cancel = cancel
+        self.ponder_results = results
+
+        def ponder():
+            for row, col in self.engines['O'].predict_replies(board_copy, PONDER_REPLIES):
+                board_copy[row][col] = 'X'
+                if check_win_from(board_copy, row, col, WIN_LENGTH):
+                    board_copy[row][col] = '.'
+                    continue
+                move = self.search_move(board_copy, 'O', cancel)
+                board_copy[row][col] = '.'
+                # A cancelled search may not have finished its last iteration
+                if cancel.cancelled():
+                    return
+                results[(row, col)] = move
+
+        self.ponder_thread = threading.Thread(target=ponder, daemon=True)
+        self.ponder_thread.start()
+
+    def stop_pondering(self):
+        if self.ponder_cancel is not None:
+            self.ponder_cancel.cancel()
+            self.ponder_cancel = None
+        if self.ponder_thread is not None:
+            # The search unwinds within a few nodes; wait so it does not race
+            # the next search for the transposition table
+            self.ponder_thread.join()
+            self.ponder_thread = None
+
+    def finish_ai_move(self, move, generation):
+        # Runs on the Tk thread; the move of a search from before a reset is dropped
+        if generation != self.generation:
+            return
+        self.search_cancel = None
+        self.move_now_button.config(state=tk.DISABLED)
+        self.canvas.itemconfigure(self.hint, state=tk.HIDDEN)
+        self.status.set("")
         if move:
             row, col = move
+            self.board[row][col] = self.current_player
+            self.last_move = (row, col)
             self.draw_piece(row, col, self.current_player)
 
-            if self.check_win_local(self.current_player):
-                messagebox.showinfo("game Over", f" ai wins")
-                self.canvas.unbind("<Button-1>")
+            if self.check_win_local(row, col):
                 self.ai_thinking = False
+                self.end_game(f"Player {self.current_player} win" if self.game_mode == 3 else " ai wins")
                 return
             elif self.is_draw():
-                messagebox.showinfo("game Over", "it is draw")
-                self.canvas.unbind("<Button-1>")
                 self.ai_thinking = False
+                self.end_game("It's a draw!" if self.game_mode == 3 else "it is draw")
                 return
 
             self.switch_player()
+            if self.game_mode == 3:
+                self.root.after(AI_VS_AI_DELAY_MS, self.start_search, generation)
+                return
+            # The MCTS engine keeps its tree between moves instead
+            if self.game_mode == 2:
+                self.start_pondering()
 
         self.ai_thinking = False
 
+    def end_game(self, message):
+        # No more searches or clicks until the board is reset
+        self.stop_pondering()
+        self.canvas.unbind("<Button-1>")
+        messagebox.showinfo("game Over", message)
+
     def switch_player(self):
         self.current_player = 'O' if self.current_player == 'X' else 'X'
 
-    def check_win_local(self, player):
-        return check_win(self.board, player)
+    def check_win_local(self, row, col):
+        return check_win_from(self.board, row, col, WIN_LENGTH)
 
     def is_draw(self):
         return all(cell != '.' for row in self.board for cell in row)
 
-    def is_terminal(self, board):
-        return check_win(board, 'X') or check_win(board, 'O') or all(cell != '.' for row in board for cell in row)
-
     def reset_board(self):
+        self.stop_pondering()
+        self.ponder_results = {}
+        self.cancel_search()
+        self.generation += 1
         self.board = [['.' for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
         self.current_player = 'X'
-        self.drawboard()
+        self.last_move = None
+        for engine in self.engines.values():
+            engine.new_game()
+        for solver in self.solvers.values():
+            solver.new_game()
+        for item in self.pieces.values():
+            self.canvas.delete(item)
+        self.pieces = {}
+        self.canvas.itemconfigure(self.hint, state=tk.HIDDEN)
+        self.move_now_button.config(state=tk.DISABLED)
+        self.status.set("")
         self.canvas.bind("<Button-1>", self.handle_click)
         self.ai_thinking = False
 
-        if self.game_mode == 2 and self.current_player == 'O':
+        if self.game_mode in (2, 4) and self.current_player == 'O':
             self.ai_thinking = True
             self.root.after(100, self.ai_move_thread)
         elif self.game_mode == 3:
             self.start_ai_vs_ai()
 
+    def exit_game(self):
+        self.stop_pondering()
+        self.cancel_search()
+        self.root.quit()
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = GomokuGUI(root)
@@ -1,46 +1,356 @@
+import multiprocessing
 import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout, wait
+
+from bitboard import BitBoard
+from vector_eval import numpy_available, board_to_array, value_array, batch_evaluate_moves, CELL_CODES
+from vcf import find_vcf, VCF_NODE_LIMIT
+from threats import scan_threats, RANK_NAMES
 
 # Define evaluation scores
 WIN_SCORE = 1000000
 POTENTIAL_WIN_SCORES = {4: 50000, 3: 5000, 2: 500, 1: 50}
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
 
-def get_relevant_moves(board, board_size, radius=1):
-    Place_not_empty = False
-    moves = []
+# Transposition table entry types
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2
+TT_SIZE = 1 << 18
+
+# How many nodes are searched between deadline and cancellation checks
+NODE_CHECK_INTERVAL = 16
+# How often a parallel search's parent checks its cancel token while waiting
+CANCEL_POLL_SECONDS = 0.05
+# Below this many candidates, ordering by per-move make/unmake beats the NumPy pass
+BATCH_ORDERING_MIN_MOVES = 48
+# How many of the best-ordered root moves are tried as answers to an opponent VCF
+VCF_DEFENSE_CANDIDATES = 10
+# Interior nodes with fewer plies left than this are ordered by the TT move,
+# killers and history only; the static evaluation pass costs more than it saves
+STATIC_ORDERING_MIN_REMAINING = 2
+KILLERS_PER_PLY = 2
+# What BoardState.forcing reports for the stone just played
+FORCING_THREE, FORCING_FOUR = 1, 2
+# History score the root's threat cells start with, for the most urgent rank;
+# below one cutoff's worth, so it only breaks ties between quiet moves
+THREAT_HISTORY_BONUS = 0.9
+
+_zobrist_tables = {}
+# In a worker process: transposition tables by engine settings (see _search_root_move)
+_transposition_tables = {}
+
+# Persistent process pools for parallel root search, keyed by worker count
+_process_pools = {}
+_process_pools_lock = threading.Lock()
+# In a worker process: the best root score found so far by any worker, and
+# the flag the parent sets to stop the current search
+_worker_alpha = None
+_worker_stop = None
+
+
+def get_zobrist_table(board_size):
+    # Random 64-bit keys per (player, cell), plus one for "O to move"
+    table = _zobrist_tables.get(board_size)
+    if table is None:
+        rng = random.Random(board_size)
+        table = {
+            'X': [[rng.getrandbits(64) for _ in range(board_size)] for _ in range(board_size)],
+            'O': [[rng.getrandbits(64) for _ in range(board_size)] for _ in range(board_size)],
+            'side': rng.getrandbits(64),
+        }
+        _zobrist_tables[board_size] = table
+    return table
+
+
+def zobrist_hash(board, board_size, is_maximizing=True):
+    table = get_zobrist_table(board_size)
+    key = table['side'] if is_maximizing else 0
     for i in range(board_size):
         for j in range(board_size):
             if board[i][j] != '.':
-                Place_not_empty = True
-                break
-        if Place_not_empty:
-            break
-    if not Place_not_empty:
-        center = board_size // 2
+                key ^= table[board[i][j]][i][j]
+    return key
+
+
+class TranspositionTable:
+    def __init__(self, size=TT_SIZE):
+        # Fixed number of slots indexed by the low bits of the key
+        self.mask = size - 1
+        self.slots = [None] * size
+        self.generation = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.slots = [None] * (self.mask + 1)
+        self.generation = 0
+
+    def lookup(self, key):
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, best_move):
+        index = key & self.mask
+        entry = self.slots[index]
+        # Keep deeper results from the current search, replace anything else
+        if entry is not None and entry[0] != key and entry[5] == self.generation and entry[1] > depth:
+            return
+        self.slots[index] = (key, depth, score, flag, best_move, self.generation)
+
+
+def check_win_from(board, row, col, win_length=5):
+    # Only the four lines through the last placed stone can hold a new win
+    player = board[row][col]
+    if player == '.':
+        return False
+    board_size = len(board)
+    for di, dj in DIRECTIONS:
+        count = 1
+        i, j = row + di, col + dj
+        while 0 <= i < board_size and 0 <= j < board_size and board[i][j] == player:
+            count += 1
+            i += di
+            j += dj
+        i, j = row - di, col - dj
+        while 0 <= i < board_size and 0 <= j < board_size and board[i][j] == player:
+            count += 1
+            i -= di
+            j -= dj
+        if count >= win_length:
+            return True
+    return False
+
+def window_value_table(win_length, scores):
+    # Contribution of one window to evaluate_board, indexed by [x_count][o_count]
+    values = [[0] * (win_length + 1) for _ in range(win_length + 1)]
+    for x_count in range(1, win_length):
+        values[x_count][0] = -scores[x_count]
+        if x_count == win_length - 1:
+            values[x_count][0] -= 90000
+    for o_count in range(1, win_length):
+        values[0][o_count] = scores[o_count] * 1.2
+        if o_count == win_length - 1:
+            values[0][o_count] += 120000
+    return values
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchCancelled(SearchTimeout):
+    # Unwinds like a timeout, so the search returns its best move so far
+    pass
+
+
+class CancelToken:
+    # Handed to a search by another thread, which calls cancel() to stop it
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def cancelled(self):
+        return self._event.is_set()
+
+
+class _SharedStopFlag:
+    # CancelToken interface over a multiprocessing.Value, for worker processes
+    def __init__(self, flag):
+        self.flag = flag
+
+    def cancelled(self):
+        return self.flag.value != 0
+
+
+class SearchStats:
+    # Counters and timings a search records when given one through its SearchContext
+    def __init__(self):
+        self.nodes = 0
+        self.interior_nodes = 0
+        self.leaf_evals = 0
+        self.order_evals = 0
+        self.children_searched = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.width_pruned = 0
+        self.reductions = 0
+        self.re_searches = 0
+        self.extensions = 0
+        self.eval_time = 0.0
+        self.order_time = 0.0
+        self.movegen_time = 0.0
+        self.wincheck_time = 0.0
+        self.total_time = 0.0
+        # (depth, seconds, nodes, best move) per completed iteration
+        self.depths = []
+        self.best_move = None
+
+    def branching_factor(self):
+        return self.children_searched / self.interior_nodes if self.interior_nodes else 0.0
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.0
+
+    def as_dict(self):
+        result = dict(self.__dict__)
+        result['depths'] = [list(entry) for entry in self.depths]
+        result['branching_factor'] = self.branching_factor()
+        result['first_move_cutoff_rate'] = self.first_move_cutoff_rate()
+        return result
+
+    def summary(self):
+        nps = self.nodes / self.total_time if self.total_time > 0 else 0
+        lines = [
+            f"nodes {self.nodes} ({nps:.0f}/s), interior {self.interior_nodes}, leaves {self.leaf_evals}, "
+            f"ordering evals {self.order_evals}",
+            f"branching factor {self.branching_factor():.1f}, beta cutoffs {self.beta_cutoffs} "
+            f"({self.first_move_cutoff_rate():.0%} on first move)",
+            f"tt probes {self.tt_probes}, hits {self.tt_hits}, cutoffs {self.tt_cutoffs}",
+            f"moves cut by width {self.width_pruned}, reductions {self.reductions} "
+            f"({self.re_searches} re-searched), extensions {self.extensions}",
+            f"time {self.total_time:.3f}s: eval {self.eval_time:.3f}s, ordering {self.order_time:.3f}s, "
+            f"move gen {self.movegen_time:.3f}s, win checks {self.wincheck_time:.3f}s",
+        ]
+        for depth, seconds, nodes, move in self.depths:
+            lines.append(f"  depth {depth}: {seconds:.3f}s, {nodes} nodes, best {move}")
+        return "\n".join(lines)
+
+
+def _timed(stats, field, function, *args):
+    # Call function(*args), adding its run time to stats.<field>
+    start = time.perf_counter()
+    result = function(*args)
+    setattr(stats, field, getattr(stats, field) + time.perf_counter() - start)
+    return result
+
+
+class Selectivity:
+    # Selective search controls for alpha-beta; the defaults search every
+    # candidate at full depth.
+    #   widths: candidate cap per ply from the root (the last one repeats);
+    #     moves completing or blocking a line are kept past the cap
+    #   lmr_moves, lmr_min_remaining, lmr_reduction: moves after the first
+    #     lmr_moves, at nodes with at least lmr_min_remaining plies left, are
+    #     searched lmr_reduction plies shallower, and again at full depth if
+    #     that fails high
+    #   four_extension, three_extension: extra plies after a move that makes
+    #     a four or an open three, up to max_extension plies per line
+    def __init__(self, widths=None, lmr_moves=None, lmr_min_remaining=3, lmr_reduction=1,
+                 four_extension=0, three_extension=0, max_extension=2):
+        self.widths = tuple(widths) if widths else None
+        self.lmr_moves = lmr_moves
+        self.lmr_min_remaining = max(lmr_min_remaining, lmr_reduction + 1)
+        self.lmr_reduction = lmr_reduction
+        self.four_extension = four_extension
+        self.three_extension = three_extension
+        self.max_extension = max_extension
+
+    def width(self, ply):
+        if self.widths is None:
+            return None
+        return self.widths[min(ply, len(self.widths) - 1)]
+
+
+class SearchContext:
+    def __init__(self, time_limit_ms=None, deadline=None, stats=None, cancel=None, progress=None,
+                 selectivity=None):
+        # The deadline is wall-clock time so it can be handed to worker processes
+        if deadline is None and time_limit_ms is not None:
+            deadline = time.time() + time_limit_ms / 1000.0
+        self.deadline = deadline
+        self.cancel = cancel
+        # Called as progress(depth, best move so far, nodes, seconds) as the search advances
+        self.progress = progress
+        self.nodes = 0
+        self.stats = stats
+        self.started = time.perf_counter()
+        # Move ordering memory shared by all iterations of one search: killer
+        # moves per ply and a history score per (player, move)
+        self.killers = {}
+        self.history = {'X': {}, 'O': {}}
+        self.selectivity = selectivity
+        # Deepest max_depth extensions may reach in the current iteration
+        self.extension_limit = None
+
+    def start_iteration(self, max_depth):
+        if self.selectivity is not None:
+            self.extension_limit = max_depth + self.selectivity.max_extension
+
+    def result(self, move, with_stats):
+        # What a find_best_move_* function returns: the move, plus stats if asked for
+        if not with_stats:
+            return move
+        stats = self.stats
+        stats.nodes = self.nodes
+        stats.best_move = move
+        stats.total_time = time.perf_counter() - self.started
+        return move, stats
+
+    def iteration_done(self, depth, move):
+        if self.stats is not None:
+            self.stats.depths.append((depth, time.perf_counter() - self.started, self.nodes, move))
+        self.report(depth, move)
+
+    def report(self, depth, move):
+        if self.progress is not None:
+            self.progress(depth, move, self.nodes, time.perf_counter() - self.started)
+
+    def record_cutoff(self, ply, player, move, remaining):
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLERS_PER_PLY:]
+        history = self.history[player]
+        history[move] = history.get(move, 0) + remaining * remaining
+
+    def seed_history(self, scan):
+        # Start each player's history with the ranked threat cells of the root
+        # position, so nodes ordered by history try them first
+        for player in ('X', 'O'):
+            history = self.history[player]
+            for cell, rank in scan.ranked(player):
+                history[cell] = history.get(cell, 0) + THREAT_HISTORY_BONUS * (1 - rank / len(RANK_NAMES))
+
+    def tick(self):
+        self.nodes += 1
+        if self.nodes % NODE_CHECK_INTERVAL == 0:
+            if self.cancel is not None and self.cancel.cancelled():
+                raise SearchCancelled()
+            if self.deadline is not None and time.time() >= self.deadline:
+                raise SearchTimeout()
+
+
+def swap_colors(board):
+    return [['O' if cell == 'X' else 'X' if cell == 'O' else '.' for cell in row] for row in board]
+
+
+def get_relevant_moves(board, board_size, radius=1):
+    return relevant_moves_from_bits(BitBoard.from_list(board), radius)
+
+
+def relevant_moves_from_bits(bitboard, radius=1):
+    if not bitboard.occupied():
+        center = bitboard.board_size // 2
         return [(center, center)]
-    for i in range(board_size):
-        for j in range(board_size):
-            if board[i][j] == '.':   
-                is_relevant = False  
-                for di in range(-radius, radius + 1): 
-                    for dj in range(-radius, radius + 1): 
-                        ni, nj = i + di, j + dj 
-                        if 0 <= ni < board_size and 0 <= nj < board_size and board[ni][nj] != '.':
-                            is_relevant = True
-                            break
-                    if is_relevant:
-                        break
-                if is_relevant:
-                    moves.append((i, j))
+    moves = bitboard.cells(bitboard.neighbor_mask(radius))
     # Ensure we always return a list
-    result = moves if moves else [(i, j) for i in range(board_size) for j in range(board_size) if board[i][j] == '.']
-    return result
+    return moves if moves else bitboard.cells(bitboard.empty())
 
 
 
 def evaluate_board(board, board_size, win_length):
     score = 0
-    directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
-    
+    directions = DIRECTIONS
+
     # Check each position on the board as a potential start of a winning line
     for i in range(board_size):
         for j in range(board_size):
@@ -86,220 +396,810 @@ def evaluate_board(board, board_size, win_length):
     
     return score
 
-def minimax_no_pruning(board, board_size, win_length, is_maximizing, get_legal_moves, is_terminal, check_win, depth, max_depth):
-    if check_win(board, 'X'):
-        return -WIN_SCORE
-    if check_win(board, 'O'):
-        return WIN_SCORE
-    if is_terminal(board):
-        return 0
+class BoardState:
+    # Board plus incrementally maintained evaluation, Zobrist key and
+    # candidate frontier. make/unmake only touch the windows of win_length
+    # cells and the (2 * radius + 1)^2 neighborhood around the stone.
+    def __init__(self, board, board_size, win_length=5, scores=None, radius=1):
+        self.board = board
+        self.board_size = board_size
+        self.win_length = win_length
+        self.radius = radius
+        self.scores = POTENTIAL_WIN_SCORES if scores is None else scores
+        self.window_values = window_value_table(win_length, self.scores)
+        self.zobrist = get_zobrist_table(board_size)
+        self.side_key = self.zobrist['side']
+        self.x_counts = []
+        self.o_counts = []
+        self.window_cells = []
+        self.window_directions = []
+        self.cell_windows = [[[] for _ in range(board_size)] for _ in range(board_size)]
+        self.score = 0
+        self.x_fives = 0
+        self.o_fives = 0
+        for i in range(board_size):
+            for j in range(board_size):
+                for di, dj in DIRECTIONS:
+                    end_i, end_j = i + (win_length-1)*di, j + (win_length-1)*dj
+                    if not (0 <= end_i < board_size and 0 <= end_j < board_size):
+                        continue
+                    index = len(self.x_counts)
+                    x_count = o_count = 0
+                    for k in range(win_length):
+                        cell = board[i + k*di][j + k*dj]
+                        if cell == 'X':
+                            x_count += 1
+                        elif cell == 'O':
+                            o_count += 1
+                        self.cell_windows[i + k*di][j + k*dj].append(index)
+                    self.window_cells.append(tuple((i + k*di, j + k*dj) for k in range(win_length)))
+                    self.window_directions.append((di, dj))
+                    self.x_counts.append(x_count)
+                    self.o_counts.append(o_count)
+                    self.score += self.window_values[x_count][o_count]
+                    if x_count == win_length:
+                        self.x_fives += 1
+                    elif o_count == win_length:
+                        self.o_fives += 1
+        self.key = zobrist_hash(board, board_size, is_maximizing=False)
+        # Frontier: empty cells within radius of a stone. neighbor_counts holds,
+        # per cell, how many stones are within radius, so unmake is exact.
+        self.neighbors = [[[(i + di, j + dj)
+                            for di in range(-radius, radius + 1) for dj in range(-radius, radius + 1)
+                            if (di or dj) and 0 <= i + di < board_size and 0 <= j + dj < board_size]
+                           for j in range(board_size)] for i in range(board_size)]
+        self.neighbor_counts = [[0] * board_size for _ in range(board_size)]
+        self.frontier = set()
+        self.stone_count = 0
+        for i in range(board_size):
+            for j in range(board_size):
+                if board[i][j] != '.':
+                    self.stone_count += 1
+                    for ni, nj in self.neighbors[i][j]:
+                        self.neighbor_counts[ni][nj] += 1
+        for i in range(board_size):
+            for j in range(board_size):
+                if board[i][j] == '.' and self.neighbor_counts[i][j]:
+                    self.frontier.add((i, j))
+        # int8 copy of the board for batch move scoring, when NumPy is installed
+        self.cells = None
+        if numpy_available():
+            self.cells = board_to_array(board)
+            self.value_array = value_array(self.window_values)
+
+    def make(self, row, col, player):
+        self.board[row][col] = player
+        if self.cells is not None:
+            self.cells[row, col] = CELL_CODES[player]
+        self.stone_count += 1
+        self.frontier.discard((row, col))
+        board, counts, frontier = self.board, self.neighbor_counts, self.frontier
+        for ni, nj in self.neighbors[row][col]:
+            counts[ni][nj] += 1
+            if board[ni][nj] == '.':
+                frontier.add((ni, nj))
+        self.key ^= self.zobrist[player][row][col]
+        values = self.window_values
+        x_counts, o_counts = self.x_counts, self.o_counts
+        delta = 0
+        if player == 'X':
+            for w in self.cell_windows[row][col]:
+                x, o = x_counts[w], o_counts[w]
+                delta += values[x + 1][o] - values[x][o]
+                x_counts[w] = x + 1
+                if x + 1 == self.win_length:
+                    self.x_fives += 1
+        else:
+            for w in self.cell_windows[row][col]:
+                x, o = x_counts[w], o_counts[w]
+                delta += values[x][o + 1] - values[x][o]
+                o_counts[w] = o + 1
+                if o + 1 == self.win_length:
+                    self.o_fives += 1
+        self.score += delta
+
+    def unmake(self, row, col):
+        player = self.board[row][col]
+        self.board[row][col] = '.'
+        if self.cells is not None:
+            self.cells[row, col] = 0
+        self.stone_count -= 1
+        board, counts, frontier = self.board, self.neighbor_counts, self.frontier
+        for ni, nj in self.neighbors[row][col]:
+            counts[ni][nj] -= 1
+            if not counts[ni][nj]:
+                frontier.discard((ni, nj))
+        if counts[row][col]:
+            frontier.add((row, col))
+        self.key ^= self.zobrist[player][row][col]
+        values = self.window_values
+        x_counts, o_counts = self.x_counts, self.o_counts
+        delta = 0
+        if player == 'X':
+            for w in self.cell_windows[row][col]:
+                x, o = x_counts[w], o_counts[w]
+                delta += values[x - 1][o] - values[x][o]
+                x_counts[w] = x - 1
+                if x == self.win_length:
+                    self.x_fives -= 1
+        else:
+            for w in self.cell_windows[row][col]:
+                x, o = x_counts[w], o_counts[w]
+                delta += values[x][o - 1] - values[x][o]
+                o_counts[w] = o - 1
+                if o == self.win_length:
+                    self.o_fives -= 1
+        self.score += delta
+
+    def relevant_moves(self):
+        # Same moves, in the same row-major order, as get_relevant_moves
+        if self.frontier:
+            return sorted(self.frontier)
+        if not self.stone_count:
+            center = self.board_size // 2
+            return [(center, center)]
+        # No empty cell is near a stone: a full board, or radius 0
+        board = self.board
+        return [(i, j) for i in range(self.board_size) for j in range(self.board_size) if board[i][j] == '.']
+
+    def winner(self):
+        if self.x_fives:
+            return 'X'
+        if self.o_fives:
+            return 'O'
+        return None
+
+    def evaluate(self):
+        # Same value as evaluate_board for the current position
+        if self.x_fives:
+            return -WIN_SCORE
+        if self.o_fives:
+            return WIN_SCORE
+        return self.score
+
+    def forcing(self, row, col):
+        # FORCING_FOUR if the stone at (row, col) made a line one stone short
+        # of a win, FORCING_THREE if it made an open three (two windows of one
+        # direction two stones short and free of the opponent), else 0
+        own, other = (self.x_counts, self.o_counts) if self.board[row][col] == 'X' else (self.o_counts, self.x_counts)
+        need = self.win_length - 1
+        threes = set()
+        result = 0
+        for w in self.cell_windows[row][col]:
+            if other[w]:
+                continue
+            if own[w] == need:
+                return FORCING_FOUR
+            if own[w] == need - 1:
+                direction = self.window_directions[w]
+                if direction in threes:
+                    result = FORCING_THREE
+                threes.add(direction)
+        return result
+
+    def threat_cells(self, player, stones):
+        # Empty cells of windows holding `stones` of player's stones and none of the opponent's
+        own, other = (self.x_counts, self.o_counts) if player == 'X' else (self.o_counts, self.x_counts)
+        board = self.board
+        cells = set()
+        for w in range(len(own)):
+            if own[w] == stones and not other[w]:
+                for i, j in self.window_cells[w]:
+                    if board[i][j] == '.':
+                        cells.add((i, j))
+        return cells
+
+    def threat_cells_at(self, row, col, player, stones):
+        # Same as threat_cells, for the windows through (row, col) only
+        own, other = (self.x_counts, self.o_counts) if player == 'X' else (self.o_counts, self.x_counts)
+        board = self.board
+        cells = set()
+        for w in self.cell_windows[row][col]:
+            if own[w] == stones and not other[w]:
+                for i, j in self.window_cells[w]:
+                    if board[i][j] == '.':
+                        cells.add((i, j))
+        return cells
+
+
+def order_moves(state, moves, player):
+    # Static move ordering: score every candidate by the evaluation after playing it
+    if state.cells is not None and len(moves) >= BATCH_ORDERING_MIN_MOVES:
+        scores = batch_evaluate_moves(state.cells, moves, player, state.value_array, WIN_SCORE, state.win_length)
+        move_scores = list(zip(scores.tolist(), moves))
+    else:
+        move_scores = []
+        for move in moves:
+            state.make(move[0], move[1], player)
+            move_scores.append((state.evaluate(), move))
+            state.unmake(move[0], move[1])
+    return [move for _, move in sorted(move_scores, key=lambda x: x[0], reverse=(player == 'O'))]
+
+def predict_replies(board, board_size, count, tt=None, win_length=5, scores=None):
+    # The `count` likeliest moves for X (the side the search plays against)
+    # in this position: the reply found by the last search, then by static ordering
+    state = BoardState(board, board_size, win_length, scores)
+    moves = state.relevant_moves()
+    if not moves:
+        return []
+    moves = order_moves(state, moves, 'X')
+    if tt is not None:
+        entry = tt.lookup(state.key)
+        if entry is not None and entry[4] in moves:
+            moves.remove(entry[4])
+            moves.insert(0, entry[4])
+    return moves[:count]
+
+def order_dynamic(moves, first, history):
+    # Cheap ordering: the `first` moves (TT move, then killers) that are legal
+    # here, then the rest by history score
+    ordered = []
+    for move in first:
+        if move is not None and move not in ordered and move in moves:
+            ordered.append(move)
+    rest = [move for move in moves if move not in ordered]
+    if history:
+        rest.sort(key=lambda move: history.get(move, 0), reverse=True)
+    return ordered + rest
+
+def minimax_no_pruning(board, board_size, win_length, is_maximizing, get_legal_moves, is_terminal, check_win, depth, max_depth, ctx=None, state=None):
+    if state is None:
+        state = BoardState(board, board_size, win_length)
+    stats = None
+    if ctx is not None:
+        ctx.tick()
+        stats = ctx.stats
+    winner = state.winner() if stats is None else _timed(stats, 'wincheck_time', state.winner)
+    if winner is not None:
+        return WIN_SCORE if winner == 'O' else -WIN_SCORE
     if depth == max_depth:
-        return evaluate_board(board, board_size, win_length)
+        if stats is None:
+            return state.evaluate()
+        stats.leaf_evals += 1
+        return _timed(stats, 'eval_time', state.evaluate)
 
-    moves = get_relevant_moves(board, board_size)
+    moves = state.relevant_moves() if stats is None else _timed(stats, 'movegen_time', state.relevant_moves)
+    if not moves:
+        return 0
 
-    move_scores = []
+    player = 'O' if is_maximizing else 'X'
+    if stats is None:
+        moves = order_moves(state, moves, player)
+    else:
+        stats.interior_nodes += 1
+        moves = _timed(stats, 'order_time', order_moves, state, moves, player)
+
+    best_score = float('-inf') if is_maximizing else float('inf')
     for move in moves:
         row, col = move
-        board[row][col] = 'O' if is_maximizing else 'X'
-        score = evaluate_board(board, board_size, win_length)
-        board[row][col] = '.'
-        move_scores.append((score, move))
-    moves = [move for _, move in sorted(move_scores, key=lambda x: x[0], reverse=is_maximizing)]
-
-    if is_maximizing:
-        best_score = float('-inf')
-        for move in moves:
-            row, col = move
-            board[row][col] = 'O'
-            score = minimax_no_pruning(board, board_size, win_length, False, get_legal_moves, is_terminal, check_win, depth + 1, max_depth)
-            board[row][col] = '.'
+        if stats is not None:
+            stats.children_searched += 1
+        state.make(row, col, player)
+        try:
+            score = minimax_no_pruning(board, board_size, win_length, not is_maximizing, get_legal_moves, is_terminal, check_win, depth + 1, max_depth, ctx, state)
+        finally:
+            state.unmake(row, col)
+        if is_maximizing:
             best_score = max(score, best_score)
-        return best_score
-    else:
-        best_score = float('inf')
-        for move in moves:
-            row, col = move
-            board[row][col] = 'X'
-            score = minimax_no_pruning(board, board_size, win_length, True, get_legal_moves, is_terminal, check_win, depth + 1, max_depth)
-            board[row][col] = '.'
+        else:
             best_score = min(score, best_score)
-        return best_score
+    return best_score
 
-def find_best_move_minimax(board, board_size, get_legal_moves, is_terminal, check_win, max_depth=3):
-    win_length = 5
+def find_best_move_minimax(board, board_size, get_legal_moves, is_terminal, check_win, max_depth=3, time_limit_ms=None, radius=1, context=None, with_stats=False, scores=None, cancel=None, win_length=5, state=None, progress=None):
     best_move = None
     best_score = float('-inf')
-    moves = get_relevant_moves(board, board_size)
+    # A caller-supplied context lets the caller read the node count afterwards
+    ctx = context if context is not None else SearchContext(time_limit_ms, cancel=cancel, progress=progress)
+    if with_stats and ctx.stats is None:
+        ctx.stats = SearchStats()
+    # A caller-supplied state (such as a sparse.SparseBoard) is searched in place
+    if state is None:
+        state = BoardState(board, board_size, win_length, scores, radius)
+    moves = state.relevant_moves()
     
     if not isinstance(moves, list):
         print(f"Error: find_best_move_minimax received non-list moves: {moves}")
-        return None
+        return ctx.result(None, with_stats)
     
     # Check for immediate winning moves first
     for move in moves:
         row, col = move
-        board[row][col] = 'O'
-        if check_win(board, 'O'):
-            board[row][col] = '.'
-            return move
-        board[row][col] = '.'
+        state.make(row, col, 'O')
+        won = state.o_fives > 0
+        state.unmake(row, col)
+        if won:
+            return ctx.result(move, with_stats)
     
     # Check for moves that block opponent's immediate win
+    blocking_moves = []
     for move in moves:
         row, col = move
-        board[row][col] = 'X'  
-        if check_win(board, 'X'):  
-            board[row][col] = '.'  
-            board[row][col] = 'O'  
-            score = minimax_no_pruning(board, board_size, win_length, False, get_legal_moves, is_terminal, check_win, 1, max_depth)
-            board[row][col] = '.'
+        state.make(row, col, 'X')
+        if state.x_fives:
+            blocking_moves.append(move)
+        state.unmake(row, col)
+        
+    if blocking_moves:
+        moves = blocking_moves
+    else:
+        # Otherwise, evaluate all moves as before
+        moves = order_moves(state, moves, 'O')
+    
+    # On timeout, fall back to the best fully searched root move (if any)
+    try:
+        for move in moves:
+            row, col = move
+            state.make(row, col, 'O')
+            try:
+                score = minimax_no_pruning(board, board_size, win_length, False, get_legal_moves, is_terminal, check_win, 1, max_depth, ctx, state)
+            finally:
+                state.unmake(row, col)
             if score > best_score:
                 best_score = score
                 best_move = move
+            ctx.report(max_depth, best_move)
+            if best_score >= WIN_SCORE:
+                break
+        ctx.iteration_done(max_depth, best_move)
+    except SearchTimeout:
+        # Stopped before any root move was searched: the first ordered move
+        if best_move is None and moves:
+            best_move = moves[0]
     
-    # If we found a blocking move, return it
-    if best_move is not None:
-        return best_move
-        
-    # Otherwise, evaluate all moves as before
-    move_scores = []
-    for move in moves:
+    return ctx.result(best_move, with_stats)
+
+
+def  minimax_With_pruning(board, board_size, win_length, is_maximizing, get_legal_moves, is_terminal, check_win, 
+            depth, max_depth, alpha, beta, tt=None, ctx=None, state=None):
+    if state is None:
+        state = BoardState(board, board_size, win_length)
+    stats = None
+    if ctx is not None:
+        ctx.tick()
+        stats = ctx.stats
+    winner = state.winner() if stats is None else _timed(stats, 'wincheck_time', state.winner)
+    if winner is not None:
+        return WIN_SCORE if winner == 'O' else -WIN_SCORE
+    if depth >= max_depth:
+        if stats is None:
+            return state.evaluate()
+        stats.leaf_evals += 1
+        return _timed(stats, 'eval_time', state.evaluate)
+
+    tt_move = None
+    if tt is not None:
+        key = state.key ^ state.side_key if is_maximizing else state.key
+        entry = tt.lookup(key)
+        if stats is not None:
+            stats.tt_probes += 1
+            stats.tt_hits += entry is not None
+        if entry is not None:
+            _, entry_depth, entry_score, entry_flag, tt_move, _ = entry
+            if entry_depth >= max_depth - depth:
+                if entry_flag == TT_EXACT:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
+                    return entry_score
+                if entry_flag == TT_LOWER:
+                    alpha = max(alpha, entry_score)
+                elif entry_flag == TT_UPPER:
+                    beta = min(beta, entry_score)
+                if beta <= alpha:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
+                    return entry_score
+    alpha_orig, beta_orig = alpha, beta
+
+    moves = state.relevant_moves() if stats is None else _timed(stats, 'movegen_time', state.relevant_moves)
+    if not moves:
+        return 0
+    player = 'O' if is_maximizing else 'X'
+    remaining = max_depth - depth
+    static = ctx is None or remaining >= STATIC_ORDERING_MIN_REMAINING
+    if stats is not None:
+        stats.interior_nodes += 1
+        if static:
+            stats.order_evals += len(moves)
+    if static:
+        moves = order_moves(state, moves, player) if stats is None else _timed(
+            stats, 'order_time', order_moves, state, moves, player)
+    killers = ctx.killers.get(depth, ()) if ctx is not None else ()
+    history = ctx.history[player] if ctx is not None and not static else None
+    # Search the move stored for this position first, then the killers
+    moves = order_dynamic(moves, (tt_move, *killers), history)
+    selectivity = ctx.selectivity if ctx is not None else None
+    if selectivity is not None and static:
+        moves = cap_width(state, moves, selectivity.width(depth), stats)
+
+    best_move = None
+    best_score = float('-inf') if is_maximizing else float('inf')
+    for index, move in enumerate(moves):
         row, col = move
-        board[row][col] = 'O'
+        if stats is not None:
+            stats.children_searched += 1
+        state.make(row, col, player)
         try:
-            score = evaluate_board(board, board_size, win_length)
+            child_depth = max_depth
+            reduced = False
+            if selectivity is not None:
+                child_depth, reduced = _selective_depth(state, selectivity, ctx, row, col, index, max_depth, remaining)
+            if index == 0:
+                score = minimax_With_pruning(board, board_size, win_length, not is_maximizing, get_legal_moves, is_terminal, 
+                                        check_win, depth + 1, child_depth, alpha, beta, tt, ctx, state)
+            else:
+                # Principal variation search: prove the move is no better with a
+                # null window, and search it fully only if that fails
+                if is_maximizing:
+                    score = minimax_With_pruning(board, board_size, win_length, False, get_legal_moves, is_terminal, 
+                                            check_win, depth + 1, child_depth, alpha, alpha + 1, tt, ctx, state)
+                else:
+                    score = minimax_With_pruning(board, board_size, win_length, True, get_legal_moves, is_terminal, 
+                                            check_win, depth + 1, child_depth, beta - 1, beta, tt, ctx, state)
+                # A reduced move that fails high is searched again at full depth
+                if reduced and (score > alpha if is_maximizing else score < beta):
+                    if stats is not None:
+                        stats.re_searches += 1
+                    child_depth = max_depth
+                    if is_maximizing:
+                        score = minimax_With_pruning(board, board_size, win_length, False, get_legal_moves, is_terminal, 
+                                                check_win, depth + 1, child_depth, alpha, alpha + 1, tt, ctx, state)
+                    else:
+                        score = minimax_With_pruning(board, board_size, win_length, True, get_legal_moves, is_terminal, 
+                                                check_win, depth + 1, child_depth, beta - 1, beta, tt, ctx, state)
+                if alpha < score < beta:
+                    score = minimax_With_pruning(board, board_size, win_length, not is_maximizing, get_legal_moves, is_terminal, 
+                                            check_win, depth + 1, child_depth, alpha, beta, tt, ctx, state)
         finally:
-            board[row][col] = '.'
-        move_scores.append((score, move))
-    
-    # Sort moves by score from highest to lowest
-    moves = [move for _, move in sorted(move_scores, key=lambda x: x[0], reverse=True)]
-    
+            state.unmake(row, col)
+        if is_maximizing:
+            if score > best_score:
+                best_score = score
+                best_move = move
+            alpha = max(alpha, best_score)
+        else:
+            if score < best_score:
+                best_score = score
+                best_move = move
+            beta = min(beta, best_score)
+        if beta <= alpha:
+            if stats is not None:
+                stats.beta_cutoffs += 1
+                stats.first_move_cutoffs += index == 0
+            if ctx is not None:
+                ctx.record_cutoff(depth, player, move, remaining)
+            break
+
+    if tt is not None:
+        if best_score <= alpha_orig:
+            flag = TT_UPPER
+        elif best_score >= beta_orig:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        tt.store(key, max_depth - depth, best_score, flag, best_move)
+    return best_score
+
+def cap_width(state, moves, width, stats=None):
+    # The first `width` moves, plus any later move that completes or blocks a line
+    if width is None or len(moves) <= width:
+        return moves
+    need = state.win_length - 1
+    urgent = state.threat_cells('O', need) | state.threat_cells('X', need)
+    kept = moves[:width] + [move for move in moves[width:] if move in urgent]
+    if stats is not None:
+        stats.width_pruned += len(moves) - len(kept)
+    return kept
+
+def _selective_depth(state, selectivity, ctx, row, col, index, max_depth, remaining):
+    # (max_depth for the child after the move just made at (row, col), whether it is reduced)
+    forcing = state.forcing(row, col)
+    if forcing:
+        extension = selectivity.four_extension if forcing == FORCING_FOUR else selectivity.three_extension
+        if extension and max_depth < ctx.extension_limit:
+            if ctx.stats is not None:
+                ctx.stats.extensions += 1
+            return min(max_depth + extension, ctx.extension_limit), False
+        return max_depth, False
+    if (selectivity.lmr_moves is not None and index >= selectivity.lmr_moves
+            and remaining >= selectivity.lmr_min_remaining):
+        if ctx.stats is not None:
+            ctx.stats.reductions += 1
+        return max_depth - selectivity.lmr_reduction, True
+    return max_depth, False
+
+def search_root(state, moves, get_legal_moves, is_terminal, check_win, max_depth, tt, ctx):
+    # One fixed-depth alpha-beta pass over the (already ordered) root moves
+    ctx.start_iteration(max_depth)
+    best_move = None
+    best_score = float('-inf')
+    alpha = float('-inf')
+    beta = float('inf')
+
     for move in moves:
         row, col = move
-        board[row][col] = 'O'
-        score = minimax_no_pruning(board, board_size, win_length, False, get_legal_moves, is_terminal, check_win, 1, max_depth)
-        board[row][col] = '.'
+        state.make(row, col, 'O')
+        try:
+            if best_move is None:
+                score = minimax_With_pruning(state.board, state.board_size, state.win_length, False, get_legal_moves, is_terminal, 
+                                        check_win, 1, max_depth, alpha, beta, tt, ctx, state)
+            else:
+                # Null-window test first; only a move that beats alpha is searched fully
+                score = minimax_With_pruning(state.board, state.board_size, state.win_length, False, get_legal_moves, is_terminal, 
+                                        check_win, 1, max_depth, alpha, alpha + 1, tt, ctx, state)
+                if score > alpha:
+                    score = minimax_With_pruning(state.board, state.board_size, state.win_length, False, get_legal_moves, is_terminal, 
+                                            check_win, 1, max_depth, alpha, beta, tt, ctx, state)
+        finally:
+            state.unmake(row, col)
         if score > best_score:
             best_score = score
             best_move = move
+        alpha = max(alpha, best_score)
         if best_score >= WIN_SCORE:
             break
-    
-    return best_move
 
+    return best_move, best_score
 
-def  minimax_With_pruning(board, board_size, win_length, is_maximizing, get_legal_moves, is_terminal, check_win, 
-            depth, max_depth, alpha, beta):
-    if check_win(board, 'X'):
-        return -WIN_SCORE
-    if check_win(board, 'O'):
-        return WIN_SCORE
-    if is_terminal(board):
-        return 0
-    if depth == max_depth:
-        return evaluate_board(board, board_size, win_length)
+def _init_worker(shared_alpha, stop_flag):
+    global _worker_alpha, _worker_stop
+    _worker_alpha = shared_alpha
+    _worker_stop = _SharedStopFlag(stop_flag)
 
-    moves = get_relevant_moves(board, board_size)
-    move_scores = []
+def worker_stop_token():
+    # In a get_process_pool worker: the pool's stop flag, as a CancelToken
+    return _worker_stop
 
-    for move in moves:
-        row, col = move
-        board[row][col] = 'O' if is_maximizing else 'X'
-        score = evaluate_board(board, board_size, win_length)
-        board[row][col] = '.'
-        move_scores.append((score, move))
-    moves = [move for _, move in sorted(move_scores, key=lambda x: x[0], reverse=is_maximizing)]
-
-    if is_maximizing:
-        best_score = float('-inf')
-        for move in moves:
-            row, col = move
-            board[row][col] = 'O'
-            score = minimax_With_pruning(board, board_size, win_length, False, get_legal_moves, is_terminal, 
-                                    check_win, depth + 1, max_depth, alpha, beta)
-            board[row][col] = '.'
-            best_score = max(score, best_score)
-            alpha = max(alpha, best_score)
-            if beta <= alpha:
-                break
-        return best_score
-    else:
-        best_score = float('inf')
-        for move in moves:
-            row, col = move
-            board[row][col] = 'X'
-            score = minimax_With_pruning(board, board_size, win_length, True, get_legal_moves, is_terminal, 
-                                    check_win, depth + 1, max_depth, alpha, beta)
-            board[row][col] = '.'
-            best_score = min(score, best_score)
-            beta = min(beta, best_score)
-            if beta <= alpha:
-                break
-        return best_score
+def get_process_pool(workers):
+    # Returns (executor, shared alpha, stop flag, lock); the lock serializes
+    # searches on one pool
+    with _process_pools_lock:
+        pool = _process_pools.get(workers)
+        if pool is None:
+            shared_alpha = multiprocessing.Value('d', float('-inf'))
+            stop_flag = multiprocessing.Value('b', 0)
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                           initargs=(shared_alpha, stop_flag))
+            pool = (executor, shared_alpha, stop_flag, threading.Lock())
+            _process_pools[workers] = pool
+        return pool
 
-def find_best_move_with_alpha_beta(board, board_size, get_legal_moves, is_terminal, check_win, max_depth=3):
-    win_length = 5
-    best_move = None
-    best_score = float('-inf')
-    alpha = float('-inf')
-    beta = float('inf')
-    moves = get_relevant_moves(board, board_size)
+def shutdown_process_pools():
+    with _process_pools_lock:
+        for executor, _, _, _ in _process_pools.values():
+            executor.shutdown(cancel_futures=True)
+        _process_pools.clear()
+
+def _search_root_move(board, board_size, win_length, radius, scores, move, max_depth, deadline, generation,
+                      selectivity=None):
+    # Runs in a worker process, using that process's own transposition table
+    state = BoardState(board, board_size, win_length, scores, radius)
+    # Engines with different settings may share the pool, so each setting
+    # gets its own table in the worker
+    table_key = (board_size, win_length, tuple(sorted(state.scores.items())))
+    tt = _transposition_tables.get(table_key)
+    if tt is None:
+        tt = TranspositionTable()
+        _transposition_tables[table_key] = tt
+    tt.generation = generation
+    ctx = SearchContext(deadline=deadline, cancel=_worker_stop, selectivity=selectivity)
+    ctx.start_iteration(max_depth)
+    # Searching just below the shared alpha keeps scores that tie with it exact,
+    # so the parent can pick the same move as the serial search would
+    alpha = _worker_alpha.value - 1
+    row, col = move
+    state.make(row, col, 'O')
+    try:
+        score = minimax_With_pruning(board, board_size, win_length, False, None, None, None,
+                                     1, max_depth, alpha, float('inf'), tt, ctx, state)
+    except SearchTimeout:
+        return None, ctx.nodes
+    with _worker_alpha.get_lock():
+        if score > _worker_alpha.value:
+            _worker_alpha.value = score
+    return score, ctx.nodes
+
+def parallel_search_root(state, moves, max_depth, tt, ctx, workers):
+    # Same result as search_root, with root moves spread over a process pool
+    executor, shared_alpha, stop_flag, lock = get_process_pool(workers)
+    board = [row[:] for row in state.board]
+    with lock:
+        shared_alpha.value = float('-inf')
+        stop_flag.value = 0
+        futures = [executor.submit(_search_root_move, board, state.board_size, state.win_length, state.radius, state.scores,
+                                   move, max_depth, ctx.deadline, tt.generation, ctx.selectivity) for move in moves]
+        scores = []
+        try:
+            for future in futures:
+                while True:
+                    try:
+                        score, nodes = future.result(timeout=CANCEL_POLL_SECONDS)
+                        break
+                    except FutureTimeout:
+                        if ctx.cancel is not None and ctx.cancel.cancelled():
+                            raise SearchCancelled()
+                ctx.nodes += nodes
+                if score is None:
+                    raise SearchTimeout()
+                scores.append(score)
+        except SearchTimeout:
+            # Stop the workers and let them unwind before the pool is reused
+            stop_flag.value = 1
+            for pending in futures:
+                pending.cancel()
+            wait(futures)
+            raise
+    # Earliest move with the best score, as in the serial root loop
+    best_score = max(scores)
+    return moves[scores.index(best_score)], best_score
+
+def find_best_move_with_alpha_beta(board, board_size, get_legal_moves, is_terminal, check_win, max_depth=3, tt=None, time_limit_ms=None, radius=1, workers=1, vcf_nodes=VCF_NODE_LIMIT, context=None, with_stats=False, scores=None, cancel=None, win_length=5, state=None, cache=None, progress=None,
+                                   selectivity=None):
+    ctx = context if context is not None else SearchContext(time_limit_ms, cancel=cancel, progress=progress,
+                                                            selectivity=selectivity)
+    if with_stats and ctx.stats is None:
+        ctx.stats = SearchStats()
+    if selectivity is not None and ctx.selectivity is None:
+        ctx.selectivity = selectivity
+    # A caller-supplied state (such as a sparse.SparseBoard) is searched in place
+    if state is None:
+        state = BoardState(board, board_size, win_length, scores, radius)
+    moves = state.relevant_moves()
+    if not moves:
+        return ctx.result(None, with_stats)
+
+    # Without a table of the caller's (an Engine keeps one across moves), the
+    # search gets a fresh one
+    if tt is None:
+        tt = TranspositionTable()
+    tt.new_search()
     
     # Check for immediate winning moves first
     for move in moves:
         row, col = move
-        board[row][col] = 'O'
-        if check_win(board, 'O'):
-            board[row][col] = '.'
-            return move
-        board[row][col] = '.'
+        state.make(row, col, 'O')
+        won = state.o_fives > 0
+        state.unmake(row, col)
+        if won:
+            return ctx.result(move, with_stats)
     
     # Check for moves that block opponent's immediate win
+    blocking_moves = []
     for move in moves:
         row, col = move
-        board[row][col] = 'X'  
-        if check_win(board, 'X'):  
-            board[row][col] = '.' 
-            board[row][col] = 'O' 
-            score = minimax_With_pruning(board, board_size, win_length, False, get_legal_moves, is_terminal, 
-                                    check_win, 1, max_depth, alpha, beta)
-            board[row][col] = '.'
-            if score > best_score:
-                best_score = score
-                best_move = move
-    
-    # If we found a blocking move, return it
-    if best_move is not None:
-        return best_move
+        state.make(row, col, 'X')
+        if state.x_fives:
+            blocking_moves.append(move)
+        state.unmake(row, col)
     
-    # Otherwise, evaluate all moves as before
-    move_scores = []
-    for move in moves:
-        row, col = move
-        board[row][col] = 'O'
+    # If the opponent threatens to win, only the blocking moves are searched
+    if blocking_moves:
+        moves = blocking_moves
+    else:
+        # Otherwise, evaluate all moves as before
+        moves = order_moves(state, moves, 'O')
+        # A forced win by continuous fours needs no full-width search, and if
+        # the opponent has one, only the candidates that stop it are kept.
+        # These searches run on the same clock as the rest; out of time, the
+        # best ordered move is played.
         try:
-            score = evaluate_board(board, board_size, win_length)
-        finally:
-            board[row][col] = '.'
-        move_scores.append((score, move))
+            if vcf_nodes:
+                vcf_move = find_vcf(state, 'O', vcf_nodes, ctx)
+                if vcf_move is not None:
+                    return ctx.result(vcf_move, with_stats)
+            if vcf_nodes and find_vcf(state, 'X', vcf_nodes, ctx) is not None:
+                defenses = []
+                for move in moves[:VCF_DEFENSE_CANDIDATES]:
+                    state.make(move[0], move[1], 'O')
+                    try:
+                        if find_vcf(state, 'X', vcf_nodes, ctx) is None:
+                            defenses.append(move)
+                    finally:
+                        state.unmake(move[0], move[1])
+                if defenses:
+                    moves = defenses
+        except SearchTimeout:
+            return ctx.result(moves[0], with_stats)
+        if ctx.selectivity is not None:
+            moves = cap_width(state, moves, ctx.selectivity.width(0), ctx.stats)
+    if len(moves) == 1:
+        return ctx.result(moves[0], with_stats)
+    # A result from the persistent cache (see disk_cache.py) that is deep
+    # enough, or a proven win, replaces the search; a shallower one gives
+    # the first move to search
+    cached = cache.lookup(state) if cache is not None else None
+    if cached is not None and cached[2] in moves:
+        cached_score, cached_depth, cached_move = cached
+        if cached_depth >= max_depth or cached_score >= WIN_SCORE:
+            return ctx.result(cached_move, with_stats)
+        moves.remove(cached_move)
+        moves.insert(0, cached_move)
+    if state.board is not None:
+        ctx.seed_history(scan_threats(state.board, 'O', win_length))
     
-    # Sort moves by score from highest to lowest
-    moves = [move for _, move in sorted(move_scores, key=lambda x: x[0], reverse=True)]
-    
-    for move in moves:
-        row, col = move
-        board[row][col] = 'O'
-        score = minimax_With_pruning(board, board_size, win_length, False, get_legal_moves, is_terminal, 
-                                check_win, 1, max_depth, alpha, beta)
-        board[row][col] = '.'
-        if score > best_score:
-            best_score = score
-            best_move = move
-        if best_score >= WIN_SCORE:
+    # Iterative deepening: keep the result of the deepest completed iteration
+    best_move = moves[0]
+    completed = None
+    for depth in range(1, max_depth + 1):
+        try:
+            if workers > 1 and isinstance(state, BoardState):
+                move, score = parallel_search_root(state, moves, depth, tt, ctx, workers)
+            else:
+                move, score = search_root(state, moves, get_legal_moves, is_terminal, check_win, depth, tt, ctx)
+        except SearchTimeout:
             break
+        best_move = move
+        completed = (score, depth)
+        ctx.iteration_done(depth, move)
+        # The principal move of this iteration is searched first in the next one
+        moves.remove(move)
+        moves.insert(0, move)
+        if abs(score) >= WIN_SCORE:
+            break
+    if cache is not None and completed is not None:
+        cache.store(state, completed[0], completed[1], best_move)
     
-    return best_move
+    return ctx.result(best_move, with_stats)
+
+
+class Engine:
+    # One player's search settings and caches. Engines share no mutable
+    # state, so many games can search at once from different threads.
+    def __init__(self, board_size=15, win_length=5, player='O', algorithm='alphabeta', max_depth=3,
+                 time_limit_ms=None, scores=None, radius=1, workers=1, vcf_nodes=VCF_NODE_LIMIT, tt_size=TT_SIZE,
+                 cache=None, selectivity=None):
+        if algorithm not in ('alphabeta', 'minimax'):
+            raise ValueError(f"unknown algorithm {algorithm!r}")
+        self.board_size = board_size
+        self.win_length = win_length
+        self.player = player
+        self.algorithm = algorithm
+        self.max_depth = max_depth
+        self.time_limit_ms = time_limit_ms
+        self.scores = dict(POTENTIAL_WIN_SCORES if scores is None else scores)
+        self.radius = radius
+        self.workers = workers
+        self.vcf_nodes = vcf_nodes
+        self.tt = TranspositionTable(tt_size)
+        # Optional disk_cache.DiskCache shared with other games and processes
+        self.cache = cache
+        # Optional Selectivity: width caps, late-move reductions and extensions
+        self.selectivity = selectivity
+
+    def new_game(self):
+        self.tt.clear()
+
+    def _own_view(self, board):
+        # The search maximizes for O, so an engine playing X sees the colors swapped.
+        # Returns (board list, None) for a list board and (None, state) for a sparse one.
+        if not isinstance(board, list):
+            if board.board_size != self.board_size:
+                raise ValueError(f"board size {board.board_size}, engine expects {self.board_size}")
+            if board.scores != self.scores or board.win_length != self.win_length:
+                raise ValueError("sparse board settings differ from the engine's")
+            return None, board.swapped() if self.player == 'X' else board
+        if len(board) != self.board_size:
+            raise ValueError(f"board is {len(board)}x{len(board)}, engine expects {self.board_size}")
+        return (swap_colors(board) if self.player == 'X' else [row[:] for row in board]), None
 
+    def best_move(self, board, max_depth=None, time_limit_ms=None, cancel=None, context=None, with_stats=False,
+                  progress=None):
+        # Best move for self.player on a list board or a sparse.SparseBoard
+        # (board_size None for an unbounded one); the board is left unchanged
+        board, state = self._own_view(board)
+        max_depth = self.max_depth if max_depth is None else max_depth
+        time_limit_ms = self.time_limit_ms if time_limit_ms is None else time_limit_ms
+        if self.algorithm == 'minimax':
+            return find_best_move_minimax(board, self.board_size, None, None, None, max_depth,
+                                          time_limit_ms=time_limit_ms, radius=self.radius, context=context,
+                                          with_stats=with_stats, scores=self.scores, cancel=cancel,
+                                          win_length=self.win_length, state=state, progress=progress)
+        return find_best_move_with_alpha_beta(board, self.board_size, None, None, None, max_depth, tt=self.tt,
+                                              time_limit_ms=time_limit_ms, radius=self.radius, workers=self.workers,
+                                              vcf_nodes=self.vcf_nodes, context=context, with_stats=with_stats,
+                                              scores=self.scores, cancel=cancel, win_length=self.win_length,
+                                              state=state, cache=self.cache, progress=progress,
+                                              selectivity=self.selectivity)
 
+    def predict_replies(self, board, count):
+        # Likeliest opponent replies (on a list board), using this engine's last search
+        return predict_replies(self._own_view(board)[0], self.board_size, count, self.tt, self.win_length, self.scores)
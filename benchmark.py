@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from MiniMax import (find_best_move_with_alpha_beta, find_best_move_minimax, TranspositionTable,
+                     SearchContext, SearchStats, shutdown_process_pools)
+
+# Fixed positions; O (the engine) is to move. Stones are (row, col).
+POSITIONS = [
+    {'name': 'opening-15', 'category': 'opening', 'size': 15,
+     'x': [(7, 7), (7, 8), (8, 8)], 'o': [(6, 6), (9, 8)]},
+    {'name': 'opening-19', 'category': 'opening', 'size': 19,
+     'x': [(9, 9), (10, 10)], 'o': [(8, 10)]},
+    {'name': 'midgame-15', 'category': 'midgame', 'size': 15,
+     'x': [(4, 7), (5, 8), (7, 10), (8, 4), (8, 10), (9, 7), (10, 4)],
+     'o': [(4, 4), (4, 10), (6, 4), (6, 9), (7, 7), (10, 5), (10, 10)]},
+    {'name': 'midgame-19', 'category': 'midgame', 'size': 19,
+     'x': [(7, 8), (7, 9), (7, 11), (8, 7), (8, 9), (9, 12), (10, 7), (10, 12)],
+     'o': [(6, 11), (7, 6), (7, 10), (9, 6), (10, 8), (11, 12), (12, 8), (12, 9)]},
+    {'name': 'vcf-diagonal-15', 'category': 'tactics', 'size': 15,
+     'x': [(5, 6), (6, 6), (6, 7), (6, 8), (7, 7), (8, 5), (8, 9)],
+     'o': [(4, 5), (5, 9), (6, 5), (7, 6), (7, 8), (8, 7), (9, 4)]},
+    {'name': 'vcf-win-15', 'category': 'tactics', 'size': 15,
+     'x': [(1, 1), (6, 3), (14, 14), (14, 0), (0, 14), (13, 13)],
+     'o': [(2, 2), (3, 3), (4, 4), (6, 4), (6, 5), (6, 7)]},
+    {'name': 'vcf-defend-15', 'category': 'tactics', 'size': 15,
+     'x': [(2, 2), (3, 3), (4, 4), (6, 4), (6, 5), (6, 7)],
+     'o': [(1, 1), (6, 3), (7, 7), (8, 8), (12, 2)]},
+    {'name': 'open-three-19', 'category': 'tactics', 'size': 19,
+     'x': [(9, 8), (9, 9), (9, 10), (10, 9)],
+     'o': [(8, 9), (10, 10), (11, 11)]},
+]
+
+ENGINES = ['minimax', 'alphabeta', 'alphabeta-parallel']
+
+
+def make_board(position):
+    size = position['size']
+    board = [['.'] * size for _ in range(size)]
+    for row, col in position['x']:
+        board[row][col] = 'X'
+    for row, col in position['o']:
+        board[row][col] = 'O'
+    return board
+
+
+def run_search(engine, position, depth, workers, with_stats=False):
+    # One cold search (fresh transposition table) at a fixed depth
+    board = make_board(position)
+    ctx = SearchContext(stats=SearchStats() if with_stats else None)
+    start = time.perf_counter()
+    if engine == 'minimax':
+        move = find_best_move_minimax(board, len(board), None, None, None, depth, context=ctx)
+    else:
+        move = find_best_move_with_alpha_beta(board, len(board), None, None, None, depth,
+                                              tt=TranspositionTable(), context=ctx,
+                                              workers=workers if engine == 'alphabeta-parallel' else 1)
+    elapsed = time.perf_counter() - start
+    result = {
+        'engine': engine,
+        'position': position['name'],
+        'depth': depth,
+        'move': list(move) if move else None,
+        'nodes': ctx.nodes,
+        'seconds': round(elapsed, 6),
+        'nodes_per_second': round(ctx.nodes / elapsed) if elapsed > 0 else 0,
+    }
+    if with_stats:
+        stats = ctx.stats
+        result['stats'] = {
+            'beta_cutoffs': stats.beta_cutoffs,
+            'leaf_evals': stats.leaf_evals,
+            'order_evals': stats.order_evals,
+            'first_move_cutoff_rate': round(stats.first_move_cutoff_rate(), 4),
+            'branching_factor': round(stats.branching_factor(), 2),
+            'tt_hits': stats.tt_hits,
+            'eval_time': round(stats.eval_time, 6),
+            'order_time': round(stats.order_time, 6),
+            'movegen_time': round(stats.movegen_time, 6),
+            'wincheck_time': round(stats.wincheck_time, 6),
+        }
+    return result
+
+
+def run_suite(engines, max_depths, workers, positions, with_stats=False):
+    results = []
+    for position in positions:
+        for engine in engines:
+            if engine == 'alphabeta-parallel':
+                # Start the worker pool before timing anything
+                run_search(engine, position, 1, workers)
+            for depth in range(1, max_depths[engine] + 1):
+                result = run_search(engine, position, depth, workers, with_stats)
+                results.append(result)
+                print_result(result)
+    return results
+
+
+def print_result(result):
+    move = tuple(result['move']) if result['move'] else None
+    print(f"{result['position']:<15} {result['engine']:<19} {result['depth']:>5} {result['nodes']:>9} "
+          f"{result['nodes_per_second']:>9} {result['seconds']:>9.3f}  {move}")
+    if 'stats' in result:
+        stats = result['stats']
+        print(f"{'':<15} bf {stats['branching_factor']:.1f}, cutoffs {stats['beta_cutoffs']} "
+              f"({stats['first_move_cutoff_rate']:.0%} first), evals {stats['leaf_evals']} leaf + "
+              f"{stats['order_evals']} ordering, order {stats['order_time']:.3f}s, "
+              f"eval {stats['eval_time']:.3f}s, movegen {stats['movegen_time']:.3f}s")
+
+
+def print_speedups(results):
+    # Parallel vs. serial alpha-beta wall time at the same position and depth
+    serial = {(r['position'], r['depth']): r for r in results if r['engine'] == 'alphabeta'}
+    lines = []
+    for r in results:
+        if r['engine'] != 'alphabeta-parallel':
+            continue
+        base = serial.get((r['position'], r['depth']))
+        if base and r['seconds'] > 0:
+            same = 'same move' if base['move'] == r['move'] else f"DIFFERENT move (serial {base['move']})"
+            lines.append(f"{r['position']:<15} depth {r['depth']}: {base['seconds'] / r['seconds']:.2f}x  {same}")
+    if lines:
+        print("\nParallel speedup over serial alpha-beta:")
+        print("\n".join(lines))
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    # Nodes must not grow and time must not grow by more than `tolerance`;
+    # returns the list of regressions found
+    previous = {(r['engine'], r['position'], r['depth']): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        old = previous.get((r['engine'], r['position'], r['depth']))
+        if old is None:
+            continue
+        label = f"{r['engine']} {r['position']} depth {r['depth']}"
+        if r['nodes'] > old['nodes'] * (1 + tolerance):
+            regressions.append(f"{label}: nodes {old['nodes']} -> {r['nodes']}")
+        if r['seconds'] > old['seconds'] * (1 + tolerance) and r['seconds'] - old['seconds'] > 0.01:
+            regressions.append(f"{label}: time {old['seconds']:.3f}s -> {r['seconds']:.3f}s")
+        if r['move'] != old['move']:
+            print(f"note: {label}: move changed {old['move']} -> {r['move']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless Gomoku engine benchmark")
+    parser.add_argument("--engines", default="minimax,alphabeta",
+                        help=f"comma-separated, from {', '.join(ENGINES)}")
+    parser.add_argument("--depth", type=int, default=4, help="max depth for alpha-beta engines")
+    parser.add_argument("--minimax-depth", type=int, default=3, help="max depth for minimax")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes for alphabeta-parallel")
+    parser.add_argument("--positions", help="comma-separated subset of position names")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against results saved with --json")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--stats", action="store_true",
+                        help="record cutoffs, branching factor and time breakdown (slows the search)")
+    args = parser.parse_args()
+
+    engines = args.engines.split(',')
+    for engine in engines:
+        if engine not in ENGINES:
+            parser.error(f"unknown engine {engine}")
+    max_depths = {'minimax': args.minimax_depth, 'alphabeta': args.depth, 'alphabeta-parallel': args.depth}
+    positions = POSITIONS
+    if args.positions:
+        names = args.positions.split(',')
+        positions = [p for p in POSITIONS if p['name'] in names]
+
+    print(f"{'position':<15} {'engine':<19} {'depth':>5} {'nodes':>9} {'nodes/s':>9} {'seconds':>9}  move")
+    results = run_suite(engines, max_depths, args.workers, positions, args.stats)
+    shutdown_process_pools()
+    print_speedups(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': platform.python_version(), 'workers': args.workers, 'results': results}, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
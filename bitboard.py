@@ -0,0 +1,94 @@
+class BitBoard:
+    # One Python int per player, bit (row * stride + col) set for each stone.
+    # Every row is padded with one always-empty column, so shifting by
+    # 1, stride, stride + 1 and stride - 1 walks the four line directions
+    # without wrapping from one row into the next.
+    def __init__(self, board_size, win_length=5):
+        self.board_size = board_size
+        self.win_length = win_length
+        self.stride = board_size + 1
+        self.shifts = (1, self.stride, self.stride + 1, self.stride - 1)
+        self.bits = {'X': 0, 'O': 0}
+        row_mask = (1 << board_size) - 1
+        self.cells_mask = 0
+        for row in range(board_size):
+            self.cells_mask |= row_mask << (row * self.stride)
+
+    @classmethod
+    def from_list(cls, board, win_length=5):
+        bitboard = cls(len(board), win_length)
+        for i, row in enumerate(board):
+            for j, cell in enumerate(row):
+                if cell != '.':
+                    bitboard.bits[cell] |= 1 << (i * bitboard.stride + j)
+        return bitboard
+
+    def to_list(self):
+        board = [['.' for _ in range(self.board_size)] for _ in range(self.board_size)]
+        for player in ('X', 'O'):
+            for row, col in self.cells(self.bits[player]):
+                board[row][col] = player
+        return board
+
+    def copy(self):
+        bitboard = BitBoard.__new__(BitBoard)
+        bitboard.board_size = self.board_size
+        bitboard.win_length = self.win_length
+        bitboard.stride = self.stride
+        bitboard.shifts = self.shifts
+        bitboard.bits = dict(self.bits)
+        bitboard.cells_mask = self.cells_mask
+        return bitboard
+
+    def make(self, row, col, player):
+        self.bits[player] |= 1 << (row * self.stride + col)
+
+    def unmake(self, row, col):
+        bit = ~(1 << (row * self.stride + col))
+        self.bits['X'] &= bit
+        self.bits['O'] &= bit
+
+    def get(self, row, col):
+        bit = 1 << (row * self.stride + col)
+        if self.bits['X'] & bit:
+            return 'X'
+        if self.bits['O'] & bit:
+            return 'O'
+        return '.'
+
+    def occupied(self):
+        return self.bits['X'] | self.bits['O']
+
+    def empty(self):
+        return self.cells_mask & ~self.occupied()
+
+    def has_five(self, player):
+        # A bit survives the ANDs only if win_length stones follow it in that direction
+        stones = self.bits[player]
+        for shift in self.shifts:
+            line = stones
+            for k in range(1, self.win_length):
+                line &= stones >> (shift * k)
+                if not line:
+                    break
+            if line:
+                return True
+        return False
+
+    def neighbor_mask(self, radius=1):
+        # Empty cells within `radius` (Chebyshev distance) of any stone
+        occupied = self.occupied()
+        spread = occupied
+        for _ in range(radius):
+            horizontal = (spread | (spread << 1) | (spread >> 1)) & self.cells_mask
+            spread = (horizontal | (horizontal << self.stride) | (horizontal >> self.stride)) & self.cells_mask
+        return spread & ~occupied
+
+    def cells(self, mask):
+        # (row, col) of each set bit, in row-major order
+        result = []
+        while mask:
+            low = mask & -mask
+            result.append(divmod(low.bit_length() - 1, self.stride))
+            mask ^= low
+        return result
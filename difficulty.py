@@ -0,0 +1,42 @@
+from MiniMax import Selectivity
+
+# Engine settings per difficulty, shared by the console game and the server
+
+# Scoring table the AI uses from difficulty 3 up
+HARD_SCORES = {4: 60000, 3: 6000, 2: 600, 1: 60}
+# Alpha-beta settings per difficulty: depth, scoring table and selective
+# search (see MiniMax.Selectivity; None searches every candidate at full
+# depth). Iterative deepening stops at the time budget whatever the depth.
+DIFFICULTY_SETTINGS = {
+    1: {'max_depth': 1, 'scores': None, 'selectivity': None},
+    2: {'max_depth': 2, 'scores': None, 'selectivity': None},
+    3: {'max_depth': 6, 'scores': HARD_SCORES,
+        'selectivity': Selectivity(widths=(12, 10, 8, 6, 5, 4), lmr_moves=3, four_extension=1,
+                                   three_extension=1)},
+    4: {'max_depth': 8, 'scores': HARD_SCORES,
+        'selectivity': Selectivity(widths=(10, 8, 6, 5, 4, 3), lmr_moves=2, four_extension=1,
+                                   three_extension=1)},
+}
+# Plain minimax has no move ordering to be selective with; it keeps a
+# full-width search at its old depth per difficulty
+MINIMAX_DEPTHS = {1: 1, 2: 2, 3: 3, 4: 4}
+# Lower difficulties find their own opening moves instead of playing the book's;
+# so does plain minimax at any difficulty (see should_use_book)
+BOOK_MIN_DIFFICULTY = 3
+# From this difficulty up, every algorithm first tries the exact solver on
+# positions few enough cells still matter in (see solver.can_solve)
+SOLVER_MIN_DIFFICULTY = 3
+
+
+def engine_settings(difficulty, algorithm='alphabeta'):
+    # (max_depth, scores, selectivity) of an Engine at this difficulty
+    settings = DIFFICULTY_SETTINGS.get(difficulty, DIFFICULTY_SETTINGS[2])
+    if algorithm == 'minimax':
+        return MINIMAX_DEPTHS.get(difficulty, 2), settings['scores'], None
+    return settings['max_depth'], settings['scores'], settings['selectivity']
+
+
+def should_use_book(difficulty, algorithm):
+    # Whether an engine of this algorithm ('alphabeta', 'minimax' or 'mcts')
+    # answers positions in the opening book from the book
+    return algorithm != 'minimax' and difficulty >= BOOK_MIN_DIFFICULTY
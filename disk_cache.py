@@ -0,0 +1,150 @@
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from opening_book import SYMMETRIES, INVERSE, canonical_key, stones_of
+
+# Persistent search cache: canonical position -> (score, depth, best move)
+# for the side to move (O in the search's view). The file is a header plus a
+# fixed number of buckets of WAYS records. Processes map it shared and write
+# without locks; every record carries a checksum, so a record torn by two
+# concurrent writers reads as empty instead of as a wrong result.
+CACHE_MAGIC = b'GMKC'
+CACHE_VERSION = 1
+HEADER = struct.Struct('<4sHHHHIQ')    # magic, version, board_size, win_length, ways, buckets, scores hash
+BODY = struct.Struct('<QiBBBBI')       # key, score, depth, flag, row, col, stamp
+RECORD = struct.Struct('<QiBBBBII')    # body, then the CRC32 of the body
+WAYS = 4
+DEFAULT_CACHE_BYTES = 16 << 20
+
+# Record flags
+CACHE_VALID = 1
+
+# Caches opened by this process, by file path
+_open_caches = {}
+
+
+def scores_hash(scores):
+    return zlib.crc32(repr(sorted(scores.items())).encode())
+
+
+class DiskCache:
+    # max_bytes is only used when the file is created; an existing file keeps its size
+    def __init__(self, path, board_size, win_length, scores, max_bytes=DEFAULT_CACHE_BYTES):
+        self.path = path
+        self.board_size = board_size
+        self.win_length = win_length
+        self.scores_hash = scores_hash(scores)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        if not os.path.exists(path):
+            self._create(max(1, (max_bytes - HEADER.size) // (RECORD.size * WAYS)))
+        self.file = open(path, 'r+b')
+        self.data = mmap.mmap(self.file.fileno(), 0)
+        magic, version, size, length, ways, self.buckets, saved_hash = HEADER.unpack_from(self.data, 0)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION or ways != WAYS:
+            self.close()
+            raise ValueError(f"{path} is not a search cache")
+        if (size, length, saved_hash) != (board_size, win_length, self.scores_hash):
+            self.close()
+            raise ValueError(f"{path} holds results for other board or evaluation settings")
+
+    def _create(self, buckets):
+        # Built under a temporary name and linked into place, so a process
+        # racing to create the same file opens one complete file or the other
+        temp = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(HEADER.pack(CACHE_MAGIC, CACHE_VERSION, self.board_size, self.win_length, WAYS, buckets,
+                                self.scores_hash))
+            f.truncate(HEADER.size + buckets * WAYS * RECORD.size)
+        try:
+            os.link(temp, self.path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def _key(self, state):
+        # (canonical key, symmetry), or None for a position this file cannot hold
+        if state.board_size != self.board_size or state.win_length != self.win_length:
+            return None
+        if state.board is not None:
+            stones = stones_of(state.board)
+        else:
+            stones = [(i, j, player) for (i, j), player in state.stones.items()]
+        return canonical_key(stones, self.board_size)
+
+    def _read(self, offset):
+        # (key, score, depth, row, col, stamp) of a valid record, or None
+        key, score, depth, flag, row, col, stamp, checksum = RECORD.unpack_from(self.data, offset)
+        if not flag & CACHE_VALID or zlib.crc32(self.data[offset:offset + BODY.size]) != checksum:
+            return None
+        return key, score, depth, row, col, stamp
+
+    def _bucket(self, key):
+        start = HEADER.size + (key % self.buckets) * WAYS * RECORD.size
+        return range(start, start + WAYS * RECORD.size, RECORD.size)
+
+    def lookup(self, state):
+        # (score, depth, move) for the position in `state`, or None
+        found = self._key(state)
+        if found is not None:
+            key, symmetry = found
+            for offset in self._bucket(key):
+                record = self._read(offset)
+                if record is not None and record[0] == key:
+                    self.hits += 1
+                    _, score, depth, row, col, _ = record
+                    move = SYMMETRIES[INVERSE[symmetry]](row, col, self.board_size)
+                    return score, depth, move
+        self.misses += 1
+        return None
+
+    def store(self, state, score, depth, move):
+        found = self._key(state)
+        if found is None:
+            return
+        key, symmetry = found
+        row, col = SYMMETRIES[symmetry](move[0], move[1], self.board_size)
+        # The record for this position if there is one, else an empty or torn
+        # slot, else the shallowest and then oldest record is replaced
+        victim, victim_rank = None, None
+        for offset in self._bucket(key):
+            record = self._read(offset)
+            if record is None:
+                rank = (-1, 0)
+            elif record[0] == key:
+                if record[2] > depth:
+                    return
+                victim = offset
+                break
+            else:
+                rank = (record[2], record[5])
+            if victim_rank is None or rank < victim_rank:
+                victim, victim_rank = offset, rank
+        body = BODY.pack(key, int(score), depth, CACHE_VALID, row, col, int(time.time()))
+        self.data[victim:victim + RECORD.size] = body + struct.pack('<I', zlib.crc32(body))
+        self.stores += 1
+
+    def fill(self):
+        # Fraction of the slots holding a valid record
+        slots = self.buckets * WAYS
+        used = sum(self._read(HEADER.size + index * RECORD.size) is not None for index in range(slots))
+        return used / slots
+
+
+def open_cache(directory, board_size, win_length, scores, max_bytes=DEFAULT_CACHE_BYTES):
+    # The cache file for these settings in `directory`, opened once per process
+    path = os.path.join(directory, f"search-{board_size}-{win_length}-{scores_hash(scores):08x}.cache")
+    cache = _open_caches.get(path)
+    if cache is None:
+        os.makedirs(directory, exist_ok=True)
+        cache = _open_caches[path] = DiskCache(path, board_size, win_length, scores, max_bytes)
+    return cache
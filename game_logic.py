@@ -1,14 +1,32 @@
-import threading
 import time
 import random
-import copy
 from MiniMax import *
+from bitboard import BitBoard
+from opening_book import book_move
+from sparse import SparseBoard
+from mcts import MCTSEngine
+from threats import scan_threats
+from disk_cache import open_cache
+from difficulty import engine_settings, should_use_book, SOLVER_MIN_DIFFICULTY
+from solver import Solver, solve_for_move, can_solve, OUTCOME_NAMES, SOLVER_SCORES
 
 # Debug: Confirm MiniMax module path
 print(f"Using MiniMax.py from: {__import__('MiniMax').__file__}")
 
 BOARD_SIZE = 15
 WIN_LENGTH = 5
+# Time budget for one AI move
+AI_TIME_LIMIT_MS = 10000
+# Print node counts, cutoffs and timings after each AI search
+SHOW_SEARCH_STATS = False
+# Thinking time of the MCTS engine per difficulty
+MCTS_TIME_LIMITS_MS = {1: 250, 2: 1000, 3: 3000, 4: AI_TIME_LIMIT_MS}
+# Boards at least this large are searched with the sparse representation,
+# whose cost follows the number of stones instead of the board area
+SPARSE_BOARD_SIZE = 25
+# Directory of the persistent search cache shared by all games and processes;
+# None searches every position afresh
+SEARCH_CACHE_DIR = None
 
 def setboardsize():
     global BOARD_SIZE, WIN_LENGTH
@@ -17,50 +35,48 @@ def setboardsize():
             size = int(input("Enter board size (min 5, default 15): ") or 15)
             if size > 4:
                 BOARD_SIZE = size
-                break
+                return size
             else:
                 print("Size must be at least 5.")
         except ValueError:
             print("Invalid input. Please enter an integer.")
 
-def createboard():
+def createboard(board_size=None):
+    board_size = BOARD_SIZE if board_size is None else board_size
     board = []
-    for i in range(BOARD_SIZE):
+    for i in range(board_size):
         row = []
-        for j in range(BOARD_SIZE):
+        for j in range(board_size):
             row.append('.')
         board.append(row)
     return board
 
 def printboard(board):
-    print("   " + " ".join(f"{j:2}" for j in range(BOARD_SIZE)))
+    print("   " + " ".join(f"{j:2}" for j in range(len(board))))
     for i, row in enumerate(board):
         print(f"{i:2} " + "  ".join(row))
     print()
 
 
 def check_win(board, player):
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            if all(col + i < BOARD_SIZE and board[row][col + i] == player for i in range(WIN_LENGTH)) or \
-               all(row + i < BOARD_SIZE and board[row + i][col] == player for i in range(WIN_LENGTH)) or \
-               all(row + i < BOARD_SIZE and col + i < BOARD_SIZE and board[row + i][col + i] == player for i in range(WIN_LENGTH)) or \
-               all(row + i < BOARD_SIZE and col - i >= 0 and board[row + i][col - i] == player for i in range(WIN_LENGTH)):
-                return True
-    return False
-
-def is_terminal(board):
+    return BitBoard.from_list(board, WIN_LENGTH).has_five(player)
+
+def is_terminal(board, last_move=None):
+    if last_move is not None:
+        # A new win can only run through the last placed stone
+        return check_win_from(board, last_move[0], last_move[1], WIN_LENGTH) or all(cell != '.' for row in board for cell in row)
     return check_win(board, 'X') or check_win(board, 'O') or all(cell != '.' for row in board for cell in row)
 
 def get_legal_moves(board):
-    return [(i, j) for i in range(BOARD_SIZE) for j in range(BOARD_SIZE) if board[i][j] == '.']
+    board_size = len(board)
+    return [(i, j) for i in range(board_size) for j in range(board_size) if board[i][j] == '.']
 
 def human_move(board, player):
     while True:
         try:
             move = input(f"Player {player}, enter your move (row,col): ")
             row, col = map(int, move.strip().split(','))
-            if 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE and board[row][col] == '.':
+            if 0 <= row < len(board) and 0 <= col < len(board) and board[row][col] == '.':
                 board[row][col] = player
                 break
             else:
@@ -68,56 +84,44 @@ def human_move(board, player):
         except:
             print("Invalid input format. Use row,col (e.g. 3,4)")
     printboard(board)
+    return (row, col)
 
 def simple_move_strategy(board, player):
-    opponent = 'X' if player == 'O' else 'O'
-    # Check for immediate win
-    for i in range(BOARD_SIZE):
-        for j in range(BOARD_SIZE):
-            if board[i][j] == '.':
-                board[i][j] = player
-                if check_win(board, player):
-                    board[i][j] = '.'
-                    return (i, j)
-                board[i][j] = '.'
-    # Check for immediate block (opponent win)
-    for i in range(BOARD_SIZE):
-        for j in range(BOARD_SIZE):
-            if board[i][j] == '.':
-                board[i][j] = opponent
-                if check_win(board, opponent):
-                    board[i][j] = '.'
-                    return (i, j)
-                board[i][j] = '.'
-    # Check for opponent’s four-in-a-row threat
-    for i in range(BOARD_SIZE):
-        for j in range(BOARD_SIZE):
-            if board[i][j] == '.':
-                board[i][j] = opponent
-                if (
-                    sum(1 for k in range(WIN_LENGTH) if i+k < BOARD_SIZE and board[i+k][j] == opponent) == 4 or
-                    sum(1 for k in range(WIN_LENGTH) if j+k < BOARD_SIZE and board[i][j+k] == opponent) == 4 or
-                    sum(1 for k in range(WIN_LENGTH) if i+k < BOARD_SIZE and j+k < BOARD_SIZE and board[i+k][j+k] == opponent) == 4 or
-                    sum(1 for k in range(WIN_LENGTH) if i+k < BOARD_SIZE and j-k >= 0 and board[i+k][j-k] == opponent) == 4
-                ):
-
-                    board[i][j] = '.'
-                    return (i, j)
-                board[i][j] = '.'
+    board_size = len(board)
+    # Win, block a win, then make or block an open four, then an open three;
+    # one scan of the board's lines finds them all
+    move = scan_threats(board, player, WIN_LENGTH).best()
+    if move is not None:
+        return move
     # Prefer moves near existing pieces
-    valid_moves = get_relevant_moves(board, BOARD_SIZE, radius=1)
+    valid_moves = get_relevant_moves(board, board_size, radius=1)
     if valid_moves:
         return random.choice(valid_moves)
-    if board[BOARD_SIZE//2][BOARD_SIZE//2] == '.':
-        return (BOARD_SIZE//2, BOARD_SIZE//2)
+    if board[board_size//2][board_size//2] == '.':
+        return (board_size//2, board_size//2)
     legal_moves = get_legal_moves(board)
     return random.choice(legal_moves) if legal_moves else None
 
 
-def AI_move(board, player, difficulty, use_alpha_beta=True):
-    board_size = len(board)
+def make_engine(board_size, player, difficulty, use_alpha_beta=True, algorithm=None):
+    if algorithm == 'mcts':
+        return MCTSEngine(board_size, WIN_LENGTH, player, MCTS_TIME_LIMITS_MS.get(difficulty, 1000))
+    algorithm = 'alphabeta' if use_alpha_beta else 'minimax'
+    max_depth, scores, selectivity = engine_settings(difficulty, algorithm)
+    engine = Engine(board_size, WIN_LENGTH, player, algorithm, max_depth=max_depth, time_limit_ms=AI_TIME_LIMIT_MS,
+                    scores=scores, selectivity=selectivity)
+    if SEARCH_CACHE_DIR is not None:
+        engine.cache = open_cache(SEARCH_CACHE_DIR, board_size, WIN_LENGTH, engine.scores)
+    return engine
 
-    max_depth = {1: 1, 2: 2, 3: 3, 4: 4}.get(difficulty, 2)
+
+def AI_move(board, player, difficulty, use_alpha_beta=True, show_stats=SHOW_SEARCH_STATS, cancel=None, engine=None,
+            solver=None):
+    # `engine` keeps its caches between this player's moves, and `solver`
+    # its memo; without them, fresh ones are made for the call
+    board_size = len(board)
+    if engine is None:
+        engine = make_engine(board_size, player, difficulty, use_alpha_beta)
 
     if difficulty == 1 and random.random() < 0.3:
         legal_moves = get_legal_moves(board)
@@ -125,36 +129,32 @@ def AI_move(board, player, difficulty, use_alpha_beta=True):
             row, col = random.choice(legal_moves)
             board[row][col] = player
             print(f"AI ({player}) placed at position ({row}, {col}) [random easy]")
-            return
-
-    if difficulty >= 3:
-        global POTENTIAL_WIN_SCORES
-        original_scores = POTENTIAL_WIN_SCORES.copy()
-        POTENTIAL_WIN_SCORES = {4: 60000, 3: 6000, 2: 600, 1: 60}
-
-    move_result = [None]
-    timer_event = threading.Event()
-
-    def find_move_thread():
-        try:
-            board_copy = copy.deepcopy(board)
-            find_best = find_best_move_with_alpha_beta if use_alpha_beta else find_best_move_minimax
-            move_result[0] = find_best(board_copy, board_size, get_legal_moves, is_terminal, check_win, max_depth)
-        finally:
-            timer_event.set()
-
-    thread = threading.Thread(target=find_move_thread)
-    thread.start()
-    thread.join(timeout=10.0)
-
-    if thread.is_alive():
+            return (row, col)
+
+    # Positions in the opening book are answered without searching
+    move = book_move(board) if should_use_book(difficulty, engine.algorithm) else None
+    # Endgames and small boards are solved exactly when the solver manages
+    # within its share of the time; otherwise the engine gets the rest
+    time_limit_ms = engine.time_limit_ms
+    if move is None and difficulty >= SOLVER_MIN_DIFFICULTY and can_solve(board, WIN_LENGTH, solver):
+        cache = open_cache(SEARCH_CACHE_DIR, board_size, WIN_LENGTH, SOLVER_SCORES) if SEARCH_CACHE_DIR else None
+        outcome, move, time_limit_ms = solve_for_move(board, player, WIN_LENGTH, time_limit_ms, cancel, cache, solver)
+        if outcome is not None:
+            print(f"Solver: {OUTCOME_NAMES[outcome]} for {player}")
+    if move is None:
+        # The search stops itself at the time budget (or when `cancel` is
+        # cancelled) and returns its best result so far
+        position = board
+        if board_size >= SPARSE_BOARD_SIZE and engine.algorithm != 'mcts':
+            position = SparseBoard.from_list(board, WIN_LENGTH, engine.scores, engine.radius)
+        move = engine.best_move(position, time_limit_ms=time_limit_ms, cancel=cancel, with_stats=show_stats)
+        if show_stats:
+            move, stats = move
+            print(stats.summary())
+
+    if move is None:
         print("AI took too long. Using fallback move.")
         move = simple_move_strategy(board, player)
-    else:
-        move = move_result[0]
-
-    if difficulty >= 3:
-        POTENTIAL_WIN_SCORES = original_scores
 
     if move:
         row, col = move
@@ -163,47 +163,65 @@ def AI_move(board, player, difficulty, use_alpha_beta=True):
         printboard(board)
     else:
         print("AI couldn't find a valid move.")
+    return move
 
 
 def playgame():
-    setboardsize()
-    board = createboard()
+    board_size = setboardsize()
+    board = createboard(board_size)
     print("Select Game Mode:")
     print("1 --> Human vs Human")
     print("2 --> Human vs AI (Hard, Minimax)")
     print("3 --> AI vs AI (Minimax vs Alpha-Beta)")
+    print("4 --> Human vs AI (Monte Carlo tree search)")
 
     while True:
-        mode = input("Enter mode (1-3): ").strip()
-        if mode in ['1', '2', '3']:
+        mode = input("Enter mode (1-4): ").strip()
+        if mode in ['1', '2', '3', '4']:
             break
         else:
-            print("Invalid choice. Please enter a number from 1 to 3.")
+            print("Invalid choice. Please enter a number from 1 to 4.")
 
     current_player = 'X'
-    if mode == '2':
+    if mode in ('2', '4'):
         difficulty = 3
     elif mode == '3':
         difficulty = 2
+    # One engine per AI player, so caches are reused across moves but not games
+    engines = {}
+    if mode == '2':
+        engines['O'] = make_engine(board_size, 'O', difficulty, use_alpha_beta=False)
+    elif mode == '3':
+        engines['X'] = make_engine(board_size, 'X', difficulty, use_alpha_beta=False)
+        engines['O'] = make_engine(board_size, 'O', difficulty, use_alpha_beta=True)
+    elif mode == '4':
+        engines['O'] = make_engine(board_size, 'O', difficulty, algorithm='mcts')
+    solvers = {player: Solver(board_size, WIN_LENGTH) for player in engines}
 
     printboard(board)
 
-    while not is_terminal(board):
+    last_move = None
+    while not is_terminal(board, last_move):
         print(f"{current_player}'s turn")
         if mode == '1':
-            human_move(board, current_player)
+            move = human_move(board, current_player)
         elif mode == '3':
             use_alpha_beta = (current_player == 'O')
-            AI_move(board, current_player, difficulty, use_alpha_beta)
+            move = AI_move(board, current_player, difficulty, use_alpha_beta, engine=engines[current_player],
+                           solver=solvers[current_player])
         else:
             if current_player == 'X':
-                human_move(board, current_player)
+                move = human_move(board, current_player)
             else:
-                AI_move(board, current_player, difficulty, use_alpha_beta=False)  # Minimax without pruning
-
-        if check_win(board, current_player):
-            print(f"{current_player} wins!")
-            return
+                # Minimax without pruning in mode 2, MCTS in mode 4
+                move = AI_move(board, current_player, difficulty, use_alpha_beta=False, engine=engines['O'],
+                               solver=solvers['O'])
+
+        if move:
+            last_move = move
+            if check_win_from(board, move[0], move[1], WIN_LENGTH):
+                print(f"{current_player} wins!")
+                return
 
         current_player = 'O' if current_player == 'X' else 'X'
 
@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from server import percentiles
+
+# Load generator for server.py: each client plays one game at a time on its
+# own connection, answering every AI move with a random nearby move
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+
+    async def call(self, **request):
+        self.next_id += 1
+        request['id'] = self.next_id
+        self.writer.write((json.dumps(request) + "\n").encode())
+        await self.writer.drain()
+        reply = json.loads(await self.reader.readline())
+        if reply.get('id') != self.next_id:
+            raise RuntimeError(f"reply out of order: {reply}")
+        return reply
+
+
+async def connect(args):
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    return Client(reader, writer)
+
+
+def random_reply(moves, size, rng):
+    # An empty cell next to the last stone if there is one, else any empty cell
+    taken = {tuple(move) for move in moves}
+    row, col = moves[-1] if moves else (size // 2, size // 2)
+    near = [(row + dr, col + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+            if 0 <= row + dr < size and 0 <= col + dc < size and (row + dr, col + dc) not in taken]
+    if near:
+        return rng.choice(near)
+    empty = [(r, c) for r in range(size) for c in range(size) if (r, c) not in taken]
+    return rng.choice(empty) if empty else None
+
+
+async def run_client(args, games, latencies, counts, seed):
+    rng = random.Random(seed)
+    client = await connect(args)
+    try:
+        for _ in range(games):
+            state = await client.call(op='new_game', size=args.size, ai='O', difficulty=args.difficulty,
+                                      depth=args.depth)
+            game = state['game']
+            for _ in range(args.plies):
+                if state['over']:
+                    break
+                move = random_reply(state['moves'], args.size, rng)
+                state = await client.call(op='move', game=game, row=move[0], col=move[1])
+                if state['over']:
+                    break
+                start = time.perf_counter()
+                reply = await client.call(op='ai_move', game=game, deadline_ms=args.deadline_ms)
+                latencies.append(time.perf_counter() - start)
+                if not reply['ok']:
+                    counts[reply['error']] = counts.get(reply['error'], 0) + 1
+                    break
+                counts['ok'] = counts.get('ok', 0) + 1
+                state = reply
+            await client.call(op='close', game=game)
+    finally:
+        client.writer.close()
+
+
+async def main(args):
+    latencies = []
+    counts = {}
+    per_client = [args.games // args.clients + (i < args.games % args.clients) for i in range(args.clients)]
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(args, games, latencies, counts, args.seed + i)
+                           for i, games in enumerate(per_client) if games))
+    elapsed = time.perf_counter() - start
+    client = await connect(args)
+    metrics = await client.call(op='metrics')
+    client.writer.close()
+
+    print(f"{args.games} games over {args.clients} connections in {elapsed:.2f}s")
+    moves = counts.pop('ok', 0)
+    print(f"AI moves: {moves} ({moves / elapsed:.1f}/s), failures: {counts or 'none'}")
+    print(f"client latency ms: {percentiles(latencies)}")
+    print("server metrics:", json.dumps(metrics))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for the Gomoku server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="connect to this Unix socket path instead of TCP")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent connections")
+    parser.add_argument("--games", type=int, default=32, help="games in total")
+    parser.add_argument("--plies", type=int, default=10, help="AI moves per game at most")
+    parser.add_argument("--size", type=int, default=15)
+    parser.add_argument("--difficulty", type=int, default=2)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--deadline-ms", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
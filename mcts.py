@@ -0,0 +1,349 @@
+import math
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from MiniMax import (BoardState, SearchContext, SearchTimeout, get_process_pool, worker_stop_token,
+                     CANCEL_POLL_SECONDS)
+from vcf import find_vcf
+
+# Monte Carlo tree search (UCT). Anytime: stops at a time or playout budget
+# and plays the most visited root move. Playouts use a fast policy, a
+# streamlined simple_move_strategy: win if possible, else block an immediate
+# loss, else a random move next to the stones.
+
+EXPLORATION = 1.4
+DEFAULT_TIME_LIMIT_MS = 1000
+# How many playouts run between budget and cancellation checks
+CHECK_INTERVAL = 8
+# Seconds between progress reports of a search
+PROGRESS_INTERVAL = 0.25
+
+# In a worker process: trees of the engines that last sent work here, by
+# (engine token, worker index), the least recently used dropped beyond WORKER_TREES
+WORKER_TREES = 8
+_worker_engines = OrderedDict()
+
+
+class Node:
+    __slots__ = ('move', 'parent', 'player', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, move, parent, player):
+        self.move = move
+        self.parent = parent
+        # The player who played `move` to reach this node
+        self.player = player
+        self.children = {}
+        self.untried = None
+        self.visits = 0
+        self.wins = 0.0
+
+    def select_child(self, exploration):
+        log_visits = math.log(self.visits)
+        return max(self.children.values(),
+                   key=lambda child: child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits))
+
+
+class MCTSStats:
+    def __init__(self):
+        self.playouts = 0
+        self.total_time = 0.0
+        self.reused_visits = 0
+        self.tree_depth = 0
+        self.best_move = None
+        # (move, visits, win rate) of the most visited root moves
+        self.top_moves = []
+
+    def summary(self):
+        rate = self.playouts / self.total_time if self.total_time > 0 else 0
+        lines = [f"playouts {self.playouts} ({rate:.0f}/s) in {self.total_time:.3f}s, "
+                 f"{self.reused_visits} visits reused from the previous tree"]
+        for move, visits, win_rate in self.top_moves:
+            lines.append(f"  {move}: {visits} visits, {win_rate:.1%} wins")
+        return "\n".join(lines)
+
+
+def other(player):
+    return 'O' if player == 'X' else 'X'
+
+
+def _line_threats(state, row, col, player, threats):
+    # Add the winning cells `player` gained with the stone at (row, col)
+    need = state.win_length - 1
+    own, opponent = (state.x_counts, state.o_counts) if player == 'X' else (state.o_counts, state.x_counts)
+    board = state.board
+    for w in state.cell_windows[row][col]:
+        if own[w] == need and not opponent[w]:
+            for i, j in state.window_cells[w]:
+                if board[i][j] == '.':
+                    threats.append((i, j))
+
+
+def _open_threat(threats, board):
+    # A still empty cell from a threat list; filled cells are dropped
+    while threats:
+        i, j = threats[-1]
+        if board[i][j] == '.':
+            return threats[-1]
+        threats.pop()
+    return None
+
+
+def rollout(state, to_move, rng, played):
+    # Plays the game out on `state`, appending the moves to `played`; returns the winner or None
+    board = state.board
+    threats = {'X': sorted(state.threat_cells('X', state.win_length - 1)),
+               'O': sorted(state.threat_cells('O', state.win_length - 1))}
+    player = to_move
+    while True:
+        move = _open_threat(threats[player], board)
+        if move is not None:
+            state.make(move[0], move[1], player)
+            played.append(move)
+            return player
+        move = _open_threat(threats[other(player)], board)
+        if move is None:
+            if not state.frontier:
+                moves = state.relevant_moves()
+                if not moves:
+                    return None
+                move = rng.choice(moves)
+            else:
+                move = rng.choice(tuple(state.frontier))
+        state.make(move[0], move[1], player)
+        played.append(move)
+        _line_threats(state, move[0], move[1], player, threats[player])
+        player = other(player)
+
+
+class MCTSEngine:
+    # Same best_move interface as MiniMax.Engine. With workers > 1, each
+    # worker process grows its own tree and the root statistics are summed.
+    def __init__(self, board_size=15, win_length=5, player='O', time_limit_ms=DEFAULT_TIME_LIMIT_MS,
+                 playouts=None, workers=1, exploration=EXPLORATION, radius=1, seed=None):
+        self.board_size = board_size
+        self.win_length = win_length
+        self.player = player
+        self.algorithm = 'mcts'
+        self.time_limit_ms = time_limit_ms
+        self.playouts = playouts
+        self.workers = workers
+        self.exploration = exploration
+        self.radius = radius
+        self.rng = random.Random(seed)
+        # Identifies this engine's trees in worker processes
+        self.token = self.rng.getrandbits(64)
+        self.root = None
+        self.root_stones = None
+
+    def new_game(self):
+        self.root = None
+        self.root_stones = None
+
+    def _reuse_tree(self, stones):
+        # The subtree for the current position, if it follows from the last
+        # one by at most this engine's move and the reply
+        if self.root is None or any(stones.get(cell) != player for cell, player in self.root_stones.items()):
+            return None
+        added = {cell: player for cell, player in stones.items() if cell not in self.root_stones}
+        node = self.root
+        for _ in range(len(added)):
+            player = other(node.player)
+            moves = [cell for cell, owner in added.items() if owner == player]
+            if len(moves) != 1 or moves[0] not in node.children:
+                return None
+            node = node.children[moves[0]]
+            del added[moves[0]]
+        node.parent = None
+        return node
+
+    def _root_moves(self, state, ctx=None):
+        # Immediate wins, forced blocks and wins by continuous fours decide
+        # the root moves outright; random playouts rarely find them. The VCF
+        # search stops at ctx's deadline or cancellation.
+        wins = state.threat_cells(self.player, self.win_length - 1)
+        if wins:
+            return [min(wins)]
+        blocks = state.threat_cells(other(self.player), self.win_length - 1)
+        if blocks:
+            return sorted(blocks)
+        try:
+            vcf_move = find_vcf(state, self.player, ctx=ctx)
+        except SearchTimeout:
+            vcf_move = None
+        if vcf_move is not None:
+            return [vcf_move]
+        return state.relevant_moves()
+
+    def search(self, board, time_limit_ms=None, playouts=None, cancel=None, stats=None, progress=None):
+        # Grows this engine's tree in this process; returns {move: (visits, wins)} for the root.
+        # progress(tree depth, most visited move, playouts, seconds) is called as it runs.
+        started = time.perf_counter()
+        time_limit_ms = self.time_limit_ms if time_limit_ms is None else time_limit_ms
+        playouts = self.playouts if playouts is None else playouts
+        deadline = started + time_limit_ms / 1000.0 if time_limit_ms is not None else None
+        stones = {(i, j): cell for i, row in enumerate(board) for j, cell in enumerate(row) if cell != '.'}
+        board = [row[:] for row in board]
+        state = BoardState(board, len(board), self.win_length, radius=self.radius)
+
+        root_moves = self._root_moves(state, SearchContext(time_limit_ms, cancel=cancel))
+        root = self._reuse_tree(stones)
+        # A forced position (a win or block) restricts the root moves, so the
+        # old subtree, grown over all moves, is not reused
+        if root is not None and len(root_moves) < len(state.relevant_moves()):
+            root = None
+        if root is None:
+            root = Node(None, None, other(self.player))
+        elif stats is not None:
+            stats.reused_visits = root.visits
+        if root.untried is None:
+            root.untried = root_moves
+            self.rng.shuffle(root.untried)
+        self.root, self.root_stones = root, stones
+
+        rng, exploration = self.rng, self.exploration
+        count = 0
+        tree_depth = 0
+        next_report = started + PROGRESS_INTERVAL
+        while len(root.untried) + len(root.children) > 1:
+            if count % CHECK_INTERVAL == 0 and count:
+                now = time.perf_counter()
+                if deadline is not None and now >= deadline:
+                    break
+                if cancel is not None and cancel.cancelled():
+                    break
+                if progress is not None and now >= next_report:
+                    next_report = now + PROGRESS_INTERVAL
+                    leader = max(root.children.values(), key=lambda child: child.visits)
+                    progress(tree_depth, leader.move, count, now - started)
+            if playouts is not None and count >= playouts:
+                break
+            count += 1
+            played = []
+            node = root
+            winner = None
+            # Selection
+            while not node.untried and node.children:
+                node = node.select_child(exploration)
+                state.make(node.move[0], node.move[1], node.player)
+                played.append(node.move)
+            winner = state.winner()
+            # Expansion
+            if winner is None:
+                if node.untried is None:
+                    node.untried = state.relevant_moves()
+                    rng.shuffle(node.untried)
+                if node.untried:
+                    move = node.untried.pop()
+                    child = Node(move, node, other(node.player))
+                    node.children[move] = child
+                    node = child
+                    state.make(move[0], move[1], node.player)
+                    played.append(move)
+                    winner = state.winner()
+            tree_depth = max(tree_depth, len(played))
+            # Simulation
+            if winner is None:
+                winner = rollout(state, other(node.player), rng, played)
+            # Backpropagation
+            while node is not None:
+                node.visits += 1
+                if winner == node.player:
+                    node.wins += 1
+                elif winner is None:
+                    node.wins += 0.5
+                node = node.parent
+            for move in reversed(played):
+                state.unmake(move[0], move[1])
+
+        if stats is not None:
+            stats.playouts += count
+            stats.tree_depth = max(stats.tree_depth, tree_depth)
+        result = {move: (child.visits, child.wins) for move, child in root.children.items()}
+        # Moves never expanded (a single forced move, or no time) still count
+        for move in root.untried:
+            result.setdefault(move, (0, 0.0))
+        return result
+
+    def best_move(self, board, time_limit_ms=None, playouts=None, cancel=None, with_stats=False, progress=None):
+        # Most visited root move for self.player; the board is left unchanged
+        stats = MCTSStats() if with_stats else None
+        started = time.perf_counter()
+        if self.workers > 1:
+            root_stats = self._parallel_search(board, time_limit_ms, playouts, cancel, stats, progress)
+        else:
+            root_stats = self.search(board, time_limit_ms, playouts, cancel, stats, progress)
+        move = None
+        if root_stats:
+            move = max(root_stats, key=lambda m: root_stats[m][0])
+        if stats is None:
+            return move
+        stats.total_time = time.perf_counter() - started
+        stats.best_move = move
+        ranked = sorted(root_stats.items(), key=lambda item: -item[1][0])[:5]
+        stats.top_moves = [(m, visits, wins / visits if visits else 0.0) for m, (visits, wins) in ranked]
+        return move, stats
+
+    def _parallel_search(self, board, time_limit_ms, playouts, cancel, stats, progress):
+        # The workers' trees are only seen when they return, so progress is
+        # reported once, for the merged result
+        started = time.perf_counter()
+        executor, _, stop_flag, lock = get_process_pool(self.workers)
+        settings = (self.board_size, self.win_length, self.player, self.time_limit_ms, self.exploration, self.radius)
+        per_worker = None if playouts is None and self.playouts is None else \
+            -(-(self.playouts if playouts is None else playouts) // self.workers)
+        # One wall-clock deadline for all tasks, so a task that waits for a
+        # busy process searches for what is left of the budget, not all of it
+        time_limit_ms = self.time_limit_ms if time_limit_ms is None else time_limit_ms
+        deadline = time.time() + time_limit_ms / 1000.0 if time_limit_ms is not None else None
+        with lock:
+            stop_flag.value = 0
+            futures = [executor.submit(_worker_search, self.token, index, settings, board, deadline, per_worker)
+                       for index in range(self.workers)]
+            results = []
+            for future in futures:
+                while True:
+                    try:
+                        results.append(future.result(timeout=CANCEL_POLL_SECONDS))
+                        break
+                    except FutureTimeout:
+                        # The workers stop and return what their trees have so far
+                        if cancel is not None and cancel.cancelled():
+                            stop_flag.value = 1
+        merged = {}
+        count, tree_depth = 0, 0
+        for root_stats, worker_count, worker_depth in results:
+            count += worker_count
+            tree_depth = max(tree_depth, worker_depth)
+            for move, (visits, wins) in root_stats.items():
+                total = merged.get(move, (0, 0.0))
+                merged[move] = (total[0] + visits, total[1] + wins)
+        if stats is not None:
+            stats.playouts += count
+            stats.tree_depth = max(stats.tree_depth, tree_depth)
+        if progress is not None and merged:
+            progress(tree_depth, max(merged, key=lambda m: merged[m][0]), count, time.perf_counter() - started)
+        return merged
+
+
+def _worker_search(token, index, settings, board, deadline, playouts):
+    # Runs in a worker process, which keeps one tree per engine and worker
+    # index: the pool may hand two tasks of one search to the same process,
+    # and each must grow (and report the visits of) its own tree. A tree is
+    # reused whenever its process ran the same task of the previous search.
+    key = (token, index)
+    engine = _worker_engines.get(key)
+    if engine is None:
+        board_size, win_length, player, default_time_ms, exploration, radius = settings
+        engine = MCTSEngine(board_size, win_length, player, default_time_ms, None, 1, exploration, radius,
+                            seed=(token << 8) | index)
+        _worker_engines[key] = engine
+        if len(_worker_engines) > WORKER_TREES:
+            _worker_engines.popitem(last=False)
+    else:
+        _worker_engines.move_to_end(key)
+    time_limit_ms = None if deadline is None else max(0.0, (deadline - time.time()) * 1000.0)
+    stats = MCTSStats()
+    root_stats = engine.search(board, time_limit_ms, playouts, worker_stop_token(), stats)
+    return root_stats, stats.playouts, stats.tree_depth
@@ -0,0 +1,215 @@
+import argparse
+import json
+import mmap
+import os
+import random
+import struct
+
+from MiniMax import get_zobrist_table, get_relevant_moves, Engine
+
+# File layout: header, then records sorted by key. Each record is a canonical
+# position key and the book move in the canonical orientation.
+BOOK_MAGIC = b'GMKB'
+BOOK_VERSION = 1
+HEADER = struct.Struct('<4sHHHI')   # magic, version, board_size, max_stones, record count
+RECORD = struct.Struct('<QBB')      # key, row, col
+
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+
+# The 8 symmetries of the square board, as maps of (row, col) on an n x n board
+SYMMETRIES = [
+    lambda r, c, n: (r, c),
+    lambda r, c, n: (c, n - 1 - r),
+    lambda r, c, n: (n - 1 - r, n - 1 - c),
+    lambda r, c, n: (n - 1 - c, r),
+    lambda r, c, n: (r, n - 1 - c),
+    lambda r, c, n: (n - 1 - r, c),
+    lambda r, c, n: (c, r),
+    lambda r, c, n: (n - 1 - c, n - 1 - r),
+]
+
+
+def _inverse_symmetries():
+    # INVERSE[s] undoes SYMMETRIES[s]; found by checking them on a 3x3 board
+    inverse = []
+    points = [(r, c) for r in range(3) for c in range(3)]
+    for forward in SYMMETRIES:
+        for index, backward in enumerate(SYMMETRIES):
+            if all(backward(*forward(r, c, 3), 3) == (r, c) for r, c in points):
+                inverse.append(index)
+                break
+    return inverse
+
+
+INVERSE = _inverse_symmetries()
+
+
+def stones_of(board):
+    return [(i, j, cell) for i, row in enumerate(board) for j, cell in enumerate(row) if cell != '.']
+
+
+def canonical_key(stones, board_size):
+    # Smallest Zobrist key over the 8 symmetric images of the position, and
+    # the symmetry that produces it
+    table = get_zobrist_table(board_size)
+    best_key, best_symmetry = None, 0
+    for index, transform in enumerate(SYMMETRIES):
+        key = 0
+        for i, j, player in stones:
+            r, c = transform(i, j, board_size)
+            key ^= table[player][r][c]
+        if best_key is None or key < best_key:
+            best_key, best_symmetry = key, index
+    return best_key, best_symmetry
+
+
+class OpeningBook:
+    # Read-only book memory-mapped from disk; lookups binary-search the records
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.board_size, self.max_stones, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def _find(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record_key, row, col = RECORD.unpack_from(self.data, HEADER.size + middle * RECORD.size)
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return row, col
+        return None
+
+    def lookup(self, board):
+        # Book move for the side to move, or None
+        if len(board) != self.board_size:
+            return None
+        stones = stones_of(board)
+        if len(stones) > self.max_stones:
+            return None
+        key, symmetry = canonical_key(stones, self.board_size)
+        found = self._find(key)
+        if found is None:
+            return None
+        row, col = SYMMETRIES[INVERSE[symmetry]](found[0], found[1], self.board_size)
+        if board[row][col] != '.':
+            return None
+        return (row, col)
+
+
+_default_books = {}
+
+
+def book_move(board, path=DEFAULT_BOOK_PATH):
+    # Lookup in the book at `path`, opened once per process; None if there is no book
+    if path not in _default_books:
+        _default_books[path] = OpeningBook(path) if os.path.exists(path) else None
+    book = _default_books[path]
+    return book.lookup(board) if book is not None else None
+
+
+def write_book(path, board_size, entries):
+    # entries: {canonical key: (row, col) in the canonical orientation}, with
+    # the number of stones of each position tracked by add_position
+    records = sorted(entries.items())
+    max_stones = max((stones for _, (_, _, stones) in records), default=0)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(BOOK_MAGIC, BOOK_VERSION, board_size, max_stones, len(records)))
+        for key, (row, col, _) in records:
+            f.write(RECORD.pack(key, row, col))
+
+
+def add_position(entries, board, move):
+    stones = stones_of(board)
+    key, symmetry = canonical_key(stones, len(board))
+    if key not in entries:
+        row, col = SYMMETRIES[symmetry](move[0], move[1], len(board))
+        entries[key] = (row, col, len(stones))
+
+
+def side_to_move(board):
+    x_count = sum(row.count('X') for row in board)
+    o_count = sum(row.count('O') for row in board)
+    return 'X' if x_count == o_count else 'O'
+
+
+def analysed_move(board, depth, time_limit_ms):
+    engine = Engine(len(board), player=side_to_move(board), max_depth=depth, time_limit_ms=time_limit_ms)
+    return engine.best_move(board)
+
+
+def build_from_self_play(entries, board_size, games, plies, depth, time_limit_ms, random_plies, seed):
+    rng = random.Random(seed)
+    for _ in range(games):
+        board = [['.'] * board_size for _ in range(board_size)]
+        for ply in range(plies):
+            move = analysed_move(board, depth, time_limit_ms)
+            if move is None:
+                break
+            add_position(entries, board, move)
+            # Vary the opening by playing a random nearby move for the first plies
+            if ply < random_plies:
+                move = rng.choice(get_relevant_moves(board, board_size))
+            board[move[0]][move[1]] = side_to_move(board)
+
+
+def build_from_games(entries, board_size, path, plies):
+    # Games as JSON lines with a "moves" list of [row, col], X moving first,
+    # and a "winner" ('X', 'O' or null for a draw); games without a result
+    # are skipped. Each position gets the move that scored best for the side
+    # that played it (a win 1, a draw 0.5), if that move scored at least even.
+    tallies = {}
+    stone_counts = {}
+    with open(path) as f:
+        for line in f:
+            game = json.loads(line)
+            if game.get('board_size', board_size) != board_size or 'winner' not in game:
+                continue
+            board = [['.'] * board_size for _ in range(board_size)]
+            for row, col in game['moves'][:plies]:
+                player = side_to_move(board)
+                stones = stones_of(board)
+                key, symmetry = canonical_key(stones, board_size)
+                stone_counts[key] = len(stones)
+                # (score, games) per move, in the canonical orientation
+                tally = tallies.setdefault(key, {}).setdefault(SYMMETRIES[symmetry](row, col, board_size), [0.0, 0])
+                tally[0] += 1.0 if game['winner'] == player else 0.5 if game['winner'] is None else 0.0
+                tally[1] += 1
+                board[row][col] = player
+    for key, moves in tallies.items():
+        (row, col), (score, games) = max(moves.items(), key=lambda item: (item[1][0] / item[1][1], item[1][1]))
+        if key not in entries and score >= games / 2:
+            entries[key] = (row, col, stone_counts[key])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a Gomoku opening book")
+    parser.add_argument("output", nargs='?', default=DEFAULT_BOOK_PATH)
+    parser.add_argument("--size", type=int, default=15)
+    parser.add_argument("--games", type=int, default=20, help="self-play games")
+    parser.add_argument("--plies", type=int, default=6, help="book positions per game")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--time-limit-ms", type=int, default=5000)
+    parser.add_argument("--random-plies", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--from-games", help="JSON lines file of recorded games to add")
+    args = parser.parse_args()
+
+    entries = {}
+    if args.from_games:
+        build_from_games(entries, args.size, args.from_games, args.plies)
+    if args.games:
+        build_from_self_play(entries, args.size, args.games, args.plies, args.depth,
+                             args.time_limit_ms, args.random_plies, args.seed)
+    write_book(args.output, args.size, entries)
+    print(f"Wrote {len(entries)} positions to {args.output}")
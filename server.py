@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from MiniMax import Engine, check_win_from
+from opening_book import book_move
+from disk_cache import open_cache
+from difficulty import engine_settings, should_use_book, SOLVER_MIN_DIFFICULTY
+from solver import Solver, solve_for_move, can_solve, SOLVER_SCORES
+
+# JSON lines protocol, one request per line, answered in order per connection:
+#   {"id": 1, "op": "new_game", "size": 15, "ai": "O", "difficulty": 3}
+#   {"id": 2, "op": "move", "game": 1, "row": 7, "col": 7}
+#   {"id": 3, "op": "ai_move", "game": 1, "deadline_ms": 2000}
+#   {"id": 4, "op": "state", "game": 1}
+#   {"id": 5, "op": "close", "game": 1}
+#   {"id": 6, "op": "metrics"}
+# Every reply carries the request's "id" and "ok"; failures add "error".
+
+DEFAULT_DEADLINE_MS = 5000
+# Time kept back from a request's deadline for dispatch and the reply
+DEADLINE_MARGIN_MS = 50
+LATENCY_SAMPLES = 1000
+# Largest board a new_game may ask for
+MAX_BOARD_SIZE = 25
+# Engines a worker process keeps, the least recently used dropped beyond this
+WORKER_ENGINES = 8
+
+# In a worker process: engines by settings and endgame solvers by board size,
+# reused across sessions and requests, and the directory of the search cache
+# all workers share (None for no cache)
+_worker_engines = OrderedDict()
+_worker_solvers = {}
+_worker_cache_dir = None
+
+
+def _init_worker(cache_dir):
+    global _worker_cache_dir
+    _worker_cache_dir = cache_dir
+
+
+def _worker_search(board, player, settings, time_limit_ms):
+    # Runs in a worker process; returns (move, search seconds)
+    start = time.perf_counter()
+    key = (len(board), player, settings)
+    algorithm, depth, difficulty = settings
+    engine = _worker_engines.get(key)
+    if engine is None:
+        _, scores, selectivity = engine_settings(difficulty, algorithm)
+        engine = Engine(len(board), player=player, algorithm=algorithm, max_depth=depth, scores=scores,
+                        selectivity=selectivity)
+        if _worker_cache_dir is not None:
+            engine.cache = open_cache(_worker_cache_dir, len(board), engine.win_length, engine.scores)
+        _worker_engines[key] = engine
+        if len(_worker_engines) > WORKER_ENGINES:
+            _worker_engines.popitem(last=False)
+    else:
+        _worker_engines.move_to_end(key)
+    move = book_move(board) if should_use_book(difficulty, algorithm) else None
+    if move is None and difficulty >= SOLVER_MIN_DIFFICULTY:
+        solver = _worker_solvers.get(len(board))
+        if solver is None:
+            solver = _worker_solvers[len(board)] = Solver(len(board), engine.win_length)
+        if can_solve(board, engine.win_length, solver):
+            cache = None
+            if _worker_cache_dir is not None:
+                cache = open_cache(_worker_cache_dir, len(board), engine.win_length, SOLVER_SCORES)
+            _, move, time_limit_ms = solve_for_move(board, player, engine.win_length, time_limit_ms, cache=cache,
+                                                    solver=solver)
+    if move is None:
+        move = engine.best_move(board, time_limit_ms=time_limit_ms)
+    return move, time.perf_counter() - start
+
+
+class RequestError(Exception):
+    pass
+
+
+class GameSession:
+    def __init__(self, game_id, board_size, ai_player, settings):
+        self.game_id = game_id
+        self.board = [['.'] * board_size for _ in range(board_size)]
+        self.ai_player = ai_player
+        self.settings = settings
+        self.to_move = 'X'
+        self.winner = None
+        self.moves = []
+        # One AI request at a time per game
+        self.lock = asyncio.Lock()
+
+    def over(self):
+        return self.winner is not None or len(self.moves) == len(self.board) ** 2
+
+    def play(self, row, col):
+        if self.over():
+            raise RequestError("game is over")
+        size = len(self.board)
+        if not (0 <= row < size and 0 <= col < size) or self.board[row][col] != '.':
+            raise RequestError(f"illegal move {row},{col}")
+        self.board[row][col] = self.to_move
+        self.moves.append([row, col])
+        if check_win_from(self.board, row, col):
+            self.winner = self.to_move
+        self.to_move = 'O' if self.to_move == 'X' else 'X'
+
+    def describe(self):
+        return {'game': self.game_id, 'to_move': self.to_move, 'winner': self.winner,
+                'over': self.over(), 'moves': self.moves}
+
+
+class Metrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.ai_moves = 0
+        self.rejected = 0
+        self.deadline_missed = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.latency = deque(maxlen=LATENCY_SAMPLES)
+        self.queue_wait = deque(maxlen=LATENCY_SAMPLES)
+        self.search_time = deque(maxlen=LATENCY_SAMPLES)
+
+    def as_dict(self, sessions, workers):
+        result = {
+            'requests': self.requests, 'errors': self.errors, 'ai_moves': self.ai_moves,
+            'rejected': self.rejected, 'deadline_missed': self.deadline_missed,
+            'queue_depth': self.queue_depth, 'max_queue_depth': self.max_queue_depth,
+            'sessions': sessions, 'workers': workers,
+        }
+        for name, samples in (('latency_ms', self.latency), ('queue_ms', self.queue_wait),
+                              ('search_ms', self.search_time)):
+            result[name] = percentiles(samples)
+        return result
+
+
+def percentiles(samples):
+    # p50/p95/p99 of seconds samples, in milliseconds
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {f"p{p}": round(ordered[min(len(ordered) - 1, len(ordered) * p // 100)] * 1000, 2)
+            for p in (50, 95, 99)}
+
+
+class GameServer:
+    def __init__(self, workers, max_queue, cache_dir=None, max_size=MAX_BOARD_SIZE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_size = max_size
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_dir,))
+        # Bounds the searches in flight to the pool size; the rest wait here
+        self.slots = asyncio.Semaphore(workers)
+        self.sessions = {}
+        self.game_ids = itertools.count(1)
+        self.metrics = Metrics()
+
+    def session(self, request):
+        session = self.sessions.get(request.get('game'))
+        if session is None:
+            raise RequestError(f"unknown game {request.get('game')!r}")
+        return session
+
+    async def handle(self, request):
+        op = request.get('op')
+        if op == 'new_game':
+            return self.new_game(request)
+        if op == 'move':
+            session = self.session(request)
+            if session.to_move == session.ai_player:
+                raise RequestError("it is the AI's turn")
+            session.play(int(request['row']), int(request['col']))
+            return session.describe()
+        if op == 'ai_move':
+            return await self.ai_move(self.session(request), request)
+        if op == 'state':
+            return self.session(request).describe()
+        if op == 'close':
+            self.sessions.pop(self.session(request).game_id)
+            return {}
+        if op == 'metrics':
+            return self.metrics.as_dict(len(self.sessions), self.workers)
+        raise RequestError(f"unknown op {op!r}")
+
+    def new_game(self, request):
+        size = int(request.get('size', 15))
+        if size < 5:
+            raise RequestError("size must be at least 5")
+        if size > self.max_size:
+            raise RequestError(f"size must be at most {self.max_size}")
+        ai_player = request.get('ai', 'O')
+        if ai_player not in ('X', 'O', None):
+            raise RequestError("ai must be X, O or null")
+        difficulty = int(request.get('difficulty', 3))
+        algorithm = request.get('algorithm', 'alphabeta')
+        if algorithm not in ('alphabeta', 'minimax'):
+            raise RequestError(f"unknown algorithm {algorithm!r}")
+        # An explicit depth overrides the difficulty's
+        settings = (algorithm, int(request.get('depth', engine_settings(difficulty, algorithm)[0])), difficulty)
+        session = GameSession(next(self.game_ids), size, ai_player, settings)
+        self.sessions[session.game_id] = session
+        return session.describe()
+
+    async def ai_move(self, session, request):
+        received = time.perf_counter()
+        deadline = received + request.get('deadline_ms', DEFAULT_DEADLINE_MS) / 1000.0
+        metrics = self.metrics
+        if metrics.queue_depth >= self.max_queue:
+            metrics.rejected += 1
+            raise RequestError("server busy")
+        metrics.queue_depth += 1
+        metrics.max_queue_depth = max(metrics.max_queue_depth, metrics.queue_depth)
+        queued = True
+        try:
+            async with session.lock, self.slots:
+                metrics.queue_depth -= 1
+                queued = False
+                dispatched = time.perf_counter()
+                metrics.queue_wait.append(dispatched - received)
+                if session.over():
+                    raise RequestError("game is over")
+                if session.ai_player is not None and session.to_move != session.ai_player:
+                    raise RequestError("it is not the AI's turn")
+                budget_ms = (deadline - dispatched) * 1000 - DEADLINE_MARGIN_MS
+                if budget_ms <= 0:
+                    metrics.deadline_missed += 1
+                    raise RequestError("deadline passed while queued")
+                board = [row[:] for row in session.board]
+                loop = asyncio.get_running_loop()
+                move, seconds = await loop.run_in_executor(self.executor, _worker_search, board,
+                                                           session.to_move, session.settings, budget_ms)
+                metrics.search_time.append(seconds)
+                if move is None:
+                    raise RequestError("no move found")
+                session.play(*move)
+        finally:
+            # The request was cancelled while waiting for a worker
+            if queued:
+                metrics.queue_depth -= 1
+        metrics.ai_moves += 1
+        metrics.latency.append(time.perf_counter() - received)
+        if time.perf_counter() > deadline:
+            metrics.deadline_missed += 1
+        return dict(session.describe(), move=list(move))
+
+    async def serve_client(self, reader, writer):
+        # Requests on one connection are answered in order
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = await self.reply(line)
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def reply(self, line):
+        self.metrics.requests += 1
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError("request must be a JSON object")
+            request_id = request.get('id')
+            result = await self.handle(request)
+            return dict(result, id=request_id, ok=True)
+        except (RequestError, ValueError, KeyError, TypeError) as e:
+            self.metrics.errors += 1
+            return {'id': request_id, 'ok': False, 'error': str(e)}
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+async def main(args):
+    server = GameServer(args.workers, args.max_queue, args.cache_dir, args.max_size)
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.serve_client, path=args.unix)
+        where = args.unix
+    else:
+        listener = await asyncio.start_server(server.serve_client, args.host, args.port)
+        where = f"{args.host}:{args.port}"
+    print(f"Gomoku server on {where} with {args.workers} search workers", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gomoku game server (JSON lines over TCP or a Unix socket)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="search worker processes")
+    parser.add_argument("--max-queue", type=int, default=256, help="AI requests allowed to wait for a worker")
+    parser.add_argument("--cache-dir", help="directory of a search cache shared by the workers and across restarts")
+    parser.add_argument("--max-size", type=int, default=MAX_BOARD_SIZE, help="largest board size a game may use")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,325 @@
+import time
+
+from MiniMax import BoardState, WIN_SCORE, get_zobrist_table, order_moves, swap_colors
+from opening_book import SYMMETRIES, INVERSE
+
+# Exact solver for endgames with few cells left that matter, by depth-first
+# proof-number search (df-pn). Positions are memoized under the smallest of
+# their 8 symmetric Zobrist keys, kept incrementally, with their moves in that
+# canonical orientation.
+#
+# Only empty cells of windows that a player can still complete are tried: a
+# stone anywhere else can never be part of a line, and an extra stone never
+# hurts its owner, so those moves are no better than passing.
+#
+# A Solver keeps its memo from move to move of a game. A proof leaves bounds
+# on the outcome of the positions it decides, which the win proof and the
+# draw proof, and the searches of later moves, all use.
+
+INFINITE = 10 ** 12
+SOLVER_NODE_LIMIT = 200000
+# Positions with more live cells are not tried; beyond this few, a proof
+# rarely finishes within a move's time
+SOLVER_MAX_LIVE_CELLS = 16
+# Memo entries kept before a Solver starts afresh
+SOLVER_MEMO_LIMIT = 2000000
+# Outcomes for the side to move
+WIN, DRAW, LOSS = 1, 0, -1
+OUTCOME_NAMES = {WIN: 'win', DRAW: 'draw', LOSS: 'loss'}
+# Solved positions go in a disk_cache file of their own (this settings key
+# names it) with a depth deeper than any search
+SOLVER_SCORES = {'solved': 1}
+SOLVED_DEPTH = 255
+# How many nodes are searched between deadline and cancellation checks
+CHECK_INTERVAL = 256
+# A front end's solver time per move, at most half the move's budget; the
+# engine searches for what is left of it
+SOLVER_TIME_LIMIT_MS = 2000
+
+
+class SolverLimit(Exception):
+    pass
+
+
+def other(player):
+    return 'O' if player == 'X' else 'X'
+
+
+def live_cells(state):
+    # Empty cells of the windows holding stones of at most one player
+    board = state.board
+    x_counts, o_counts = state.x_counts, state.o_counts
+    cells = set()
+    for w, window in enumerate(state.window_cells):
+        if x_counts[w] and o_counts[w]:
+            continue
+        for i, j in window:
+            if board[i][j] == '.':
+                cells.add((i, j))
+    return cells
+
+
+def count_live_cells(board, win_length=5):
+    return len(live_cells(BoardState([row[:] for row in board], len(board), win_length)))
+
+
+def can_solve(board, win_length=5, solver=None):
+    # Whether the position is worth a proof: few enough live cells, and with
+    # a solver, fewer than when it last ran out of nodes or time
+    live = count_live_cells(board, win_length)
+    if live > SOLVER_MAX_LIVE_CELLS:
+        return False
+    return solver is None or solver.failed_live is None or live < solver.failed_live
+
+
+class Solver:
+    def __init__(self, board_size, win_length=5, node_limit=SOLVER_NODE_LIMIT, memo_limit=SOLVER_MEMO_LIMIT):
+        self.size = board_size
+        self.win_length = win_length
+        self.node_limit = node_limit
+        self.memo_limit = memo_limit
+        # Per player and cell: the cell's key in each of the 8 symmetric images
+        size = board_size
+        table = get_zobrist_table(size)
+        self.cell_keys = {player: [[tuple(table[player][r][c] for r, c in (t(i, j, size) for t in SYMMETRIES))
+                                    for j in range(size)] for i in range(size)] for player in ('X', 'O')}
+        self.state = None
+        self.keys = None
+        self.deadline = None
+        self.cancel = None
+        self.nodes = 0
+        self.attacker = None
+        self.new_game()
+
+    def new_game(self):
+        # Per mover: {key: [lowest, highest] outcome for the mover} and
+        # {key: moves worth trying}; per (mover, attacker): {key: [phi, delta]}
+        self.bounds = {'X': {}, 'O': {}}
+        self.moves = {'X': {}, 'O': {}}
+        self.numbers = {(mover, attacker): {} for mover in ('X', 'O') for attacker in ('X', 'O')}
+        # Live cells of the last position the solver ran out of nodes or time on
+        self.failed_live = None
+
+    def _memo_size(self):
+        return sum(len(numbers) for numbers in self.numbers.values())
+
+    def _setup(self, board, time_limit_ms, cancel):
+        size = self.size
+        self.state = BoardState([row[:] for row in board], size, self.win_length)
+        self.keys = [0] * len(SYMMETRIES)
+        for i, row in enumerate(board):
+            for j, cell in enumerate(row):
+                if cell != '.':
+                    self._toggle(i, j, cell)
+        self.deadline = time.perf_counter() + time_limit_ms / 1000.0 if time_limit_ms is not None else None
+        self.cancel = cancel
+        self.nodes = 0
+
+    def _toggle(self, row, col, player):
+        keys = self.keys
+        for s, value in enumerate(self.cell_keys[player][row][col]):
+            keys[s] ^= value
+
+    def _canonical(self):
+        # (smallest symmetric key, index of the symmetry giving it)
+        keys = self.keys
+        symmetry = min(range(len(keys)), key=keys.__getitem__)
+        return keys[symmetry], symmetry
+
+    def _child_key(self, row, col, player):
+        return min(key ^ value for key, value in zip(self.keys, self.cell_keys[player][row][col]))
+
+    def make(self, row, col, player):
+        self.state.make(row, col, player)
+        self._toggle(row, col, player)
+
+    def unmake(self, row, col):
+        self._toggle(row, col, self.state.board[row][col])
+        self.state.unmake(row, col)
+
+    def terminal(self, mover):
+        # (outcome, None) when the position is decided without search, else
+        # (None, the moves worth trying); an immediate win also gives its move
+        state = self.state
+        winner = state.winner()
+        if winner is not None:
+            return (WIN if winner == mover else LOSS), None
+        need = self.win_length - 1
+        wins = state.threat_cells(mover, need)
+        if wins:
+            return WIN, [min(wins)]
+        threats = state.threat_cells(other(mover), need)
+        if len(threats) > 1:
+            return LOSS, None
+        if threats:
+            return None, list(threats)
+        moves = live_cells(state)
+        if not moves:
+            return DRAW, None
+        return None, order_moves(state, sorted(moves), mover)
+
+    def _decided(self, bounds, mover):
+        # (phi, delta) if the outcome bounds settle the mover's goal, else
+        # None. The attacker's goal is a win, the defender's is not losing.
+        low, high = bounds
+        goal = WIN if mover == self.attacker else DRAW
+        if low >= goal:
+            return 0, INFINITE
+        if high < goal:
+            return INFINITE, 0
+        return None
+
+    def _settle(self, key, mover, phi, delta):
+        # Narrow the outcome bounds of a node this proof has decided
+        if phi and delta:
+            return
+        goal = WIN if mover == self.attacker else DRAW
+        bounds = self.bounds[mover].setdefault(key, [LOSS, WIN])
+        if phi == 0:
+            bounds[0] = max(bounds[0], goal)
+        else:
+            bounds[1] = min(bounds[1], goal - 1)
+
+    def _tick(self):
+        self.nodes += 1
+        if self.nodes >= self.node_limit:
+            raise SolverLimit()
+        if self.nodes % CHECK_INTERVAL == 0:
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SolverLimit()
+            if self.cancel is not None and self.cancel.cancelled():
+                raise SolverLimit()
+
+    def _mid(self, mover, threshold_phi, threshold_delta, root=False):
+        # Expand the node until its phi or delta reaches its threshold. phi is
+        # the proof number of the mover reaching its goal, delta the disproof
+        # number; a node's phi is its children's smallest delta, its delta
+        # the sum of their phis. The root is always expanded, so a move that
+        # proves it can be read from its children.
+        self._tick()
+        key, symmetry = self._canonical()
+        size = self.size
+        numbers = self.numbers[(mover, self.attacker)]
+        entry = numbers.get(key)
+        if entry is not None and (entry[0] == 0 or entry[1] == 0) and not root:
+            return
+        canonical_moves = self.moves[mover].get(key)
+        if canonical_moves is None:
+            bounds = self.bounds[mover].get(key)
+            if bounds is None:
+                outcome, moves = self.terminal(mover)
+                if outcome is not None:
+                    bounds = self.bounds[mover][key] = [outcome, outcome]
+                else:
+                    forward = SYMMETRIES[symmetry]
+                    canonical_moves = self.moves[mover][key] = [forward(row, col, size) for row, col in moves]
+            if canonical_moves is None:
+                numbers[key] = list(self._decided(bounds, mover))
+                return
+        if entry is None:
+            bounds = self.bounds[mover].get(key)
+            decided = self._decided(bounds, mover) if bounds is not None and not root else None
+            entry = numbers[key] = list(decided) if decided is not None else [1, 1]
+            if decided is not None:
+                return
+        backward = SYMMETRIES[INVERSE[symmetry]]
+        moves = [backward(row, col, size) for row, col in canonical_moves]
+        opponent = other(mover)
+        children = self.numbers[(opponent, self.attacker)]
+        while True:
+            best, best_phi, best_delta, second_delta = None, 0, INFINITE + 1, INFINITE
+            sum_phi = 0
+            for row, col in moves:
+                child = children.get(self._child_key(row, col, mover))
+                child_phi, child_delta = (child[0], child[1]) if child is not None else (1, 1)
+                if child_phi >= INFINITE:
+                    sum_phi = INFINITE
+                elif sum_phi < INFINITE:
+                    sum_phi = min(sum_phi + child_phi, INFINITE - 1)
+                if child_delta < best_delta:
+                    second_delta = best_delta
+                    best, best_phi, best_delta = (row, col), child_phi, child_delta
+                elif child_delta < second_delta:
+                    second_delta = child_delta
+            entry[0], entry[1] = best_delta, sum_phi
+            if best_delta >= threshold_phi or sum_phi >= threshold_delta:
+                self._settle(key, mover, best_delta, sum_phi)
+                return
+            child_threshold_phi = threshold_delta + best_phi - sum_phi
+            child_threshold_delta = min(threshold_phi, second_delta + 1)
+            self.make(best[0], best[1], mover)
+            try:
+                self._mid(opponent, child_threshold_phi, child_threshold_delta)
+            finally:
+                self.unmake(best[0], best[1])
+
+    def prove(self, mover, attacker):
+        # (whether the mover reaches its goal, a move that does) with `attacker` playing for a win
+        self.attacker = attacker
+        self._mid(mover, INFINITE, INFINITE, root=True)
+        key, symmetry = self._canonical()
+        if self.numbers[(mover, attacker)][key][0] != 0:
+            return False, None
+        children = self.numbers[(other(mover), attacker)]
+        backward = SYMMETRIES[INVERSE[symmetry]]
+        for row, col in (backward(row, col, self.size) for row, col in self.moves[mover][key]):
+            child = children.get(self._child_key(row, col, mover))
+            if child is not None and child[1] == 0:
+                return True, (row, col)
+        return True, None
+
+    def solve(self, board, player, time_limit_ms=None, cancel=None):
+        # (outcome for `player` to move, best move); the move is None when
+        # every move loses. Raises SolverLimit when out of nodes or time.
+        if self._memo_size() > self.memo_limit:
+            failed_live = self.failed_live
+            self.new_game()
+            self.failed_live = failed_live
+        self._setup(board, time_limit_ms, cancel)
+        outcome, moves = self.terminal(player)
+        if outcome is not None:
+            return outcome, moves[0] if moves else None
+        won, move = self.prove(player, player)
+        if won:
+            return WIN, move
+        held, move = self.prove(player, other(player))
+        if held:
+            return DRAW, move
+        return LOSS, None
+
+
+def solve(board, player, win_length=5, node_limit=SOLVER_NODE_LIMIT, time_limit_ms=None, cancel=None, cache=None,
+          solver=None):
+    # (outcome, move) for `player` to move, or (None, None) if the solver ran
+    # out of nodes or time. `solver` carries its memo over from earlier moves
+    # of the game; without one, a fresh solver is made for the call. `cache`
+    # is a disk_cache.DiskCache opened with SOLVER_SCORES; solved positions
+    # are looked up there first and stored.
+    state = None
+    if cache is not None:
+        view = swap_colors(board) if player == 'X' else [row[:] for row in board]
+        state = BoardState(view, len(view), win_length)
+        found = cache.lookup(state)
+        if found is not None and found[1] == SOLVED_DEPTH:
+            return found[0] // WIN_SCORE, found[2]
+    if solver is None:
+        solver = Solver(len(board), win_length, node_limit)
+    try:
+        outcome, move = solver.solve(board, player, time_limit_ms, cancel)
+    except SolverLimit:
+        solver.failed_live = count_live_cells(board, win_length)
+        return None, None
+    if cache is not None and move is not None:
+        cache.store(state, outcome * WIN_SCORE, SOLVED_DEPTH, move)
+    return outcome, move
+
+
+def solve_for_move(board, player, win_length, time_limit_ms, cancel=None, cache=None, solver=None):
+    # solve() on its share of a move's time budget (time_limit_ms, None for
+    # none); returns (outcome, move, what is left of the budget)
+    started = time.perf_counter()
+    share = SOLVER_TIME_LIMIT_MS if time_limit_ms is None else min(SOLVER_TIME_LIMIT_MS, time_limit_ms // 2)
+    outcome, move = solve(board, player, win_length, time_limit_ms=share, cancel=cancel, cache=cache, solver=solver)
+    if time_limit_ms is not None:
+        time_limit_ms = max(1, time_limit_ms - int((time.perf_counter() - started) * 1000))
+    return outcome, move, time_limit_ms
@@ -0,0 +1,244 @@
+from MiniMax import POTENTIAL_WIN_SCORES, WIN_SCORE, DIRECTIONS, FORCING_THREE, FORCING_FOUR, window_value_table
+
+# Sparse board for large and unbounded games. Only the stones and the windows
+# that hold at least one stone are stored, so building the state, make/unmake,
+# evaluation, win checks and move generation cost scales with the number of
+# stones rather than the board area. Same search interface as MiniMax.BoardState.
+
+MASK64 = (1 << 64) - 1
+
+
+def _mix64(x):
+    # splitmix64 finalizer: a well-spread 64-bit hash of x
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def cell_key(row, col, player):
+    # Zobrist-style key of one stone; works for any (even negative) coordinates
+    return _mix64(((row & 0xFFFFFFFF) << 33) | ((col & 0xFFFFFFFF) << 1) | (player == 'O'))
+
+
+SIDE_KEY = _mix64(1 << 66)
+
+
+class SparseBoard:
+    # board_size=None is an unbounded board; coordinates may then be any integers
+    def __init__(self, board_size=None, win_length=5, scores=None, radius=1):
+        self.board = None
+        self.board_size = board_size
+        self.win_length = win_length
+        self.radius = radius
+        self.scores = POTENTIAL_WIN_SCORES if scores is None else scores
+        self.window_values = window_value_table(win_length, self.scores)
+        self.side_key = SIDE_KEY
+        self.cells = None
+        self.stones = {}
+        # (start row, start col, direction) -> [x_count, o_count], for windows with a stone
+        self.windows = {}
+        self.score = 0
+        self.x_fives = 0
+        self.o_fives = 0
+        self.key = 0
+        self.neighbor_counts = {}
+        self.frontier = set()
+        self.stone_count = 0
+        # Bounding box of the stones: (min row, min col, max row, max col)
+        self.bounds = None
+
+    @classmethod
+    def from_list(cls, board, win_length=5, scores=None, radius=1):
+        state = cls(len(board), win_length, scores, radius)
+        for i, row in enumerate(board):
+            for j, cell in enumerate(row):
+                if cell != '.':
+                    state.make(i, j, cell)
+        return state
+
+    @classmethod
+    def from_moves(cls, moves, board_size=None, win_length=5, scores=None, radius=1):
+        # Moves alternate X, O, X, ...
+        state = cls(board_size, win_length, scores, radius)
+        for index, (row, col) in enumerate(moves):
+            state.make(row, col, 'X' if index % 2 == 0 else 'O')
+        return state
+
+    def to_list(self):
+        board = [['.'] * self.board_size for _ in range(self.board_size)]
+        for (row, col), player in self.stones.items():
+            board[row][col] = player
+        return board
+
+    def swapped(self):
+        # The same position with X and O exchanged
+        state = SparseBoard(self.board_size, self.win_length, self.scores, self.radius)
+        for (row, col), player in self.stones.items():
+            state.make(row, col, 'O' if player == 'X' else 'X')
+        return state
+
+    def inside(self, row, col):
+        size = self.board_size
+        return size is None or (0 <= row < size and 0 <= col < size)
+
+    def get(self, row, col):
+        return self.stones.get((row, col), '.')
+
+    def is_full(self):
+        return self.board_size is not None and self.stone_count == self.board_size * self.board_size
+
+    def _windows_through(self, row, col):
+        # Keys of the in-bounds windows that contain (row, col)
+        length = self.win_length
+        for d, (di, dj) in enumerate(DIRECTIONS):
+            for k in range(length):
+                start_i, start_j = row - k * di, col - k * dj
+                if self.inside(start_i, start_j) and self.inside(start_i + (length - 1) * di,
+                                                                  start_j + (length - 1) * dj):
+                    yield (start_i, start_j, d)
+
+    def _neighbors(self, row, col):
+        radius = self.radius
+        return [(row + di, col + dj) for di in range(-radius, radius + 1) for dj in range(-radius, radius + 1)
+                if (di or dj) and self.inside(row + di, col + dj)]
+
+    def make(self, row, col, player):
+        self.stones[(row, col)] = player
+        self.stone_count += 1
+        self.key ^= cell_key(row, col, player)
+        if self.bounds is None:
+            self.bounds = (row, col, row, col)
+        else:
+            top, left, bottom, right = self.bounds
+            self.bounds = (min(top, row), min(left, col), max(bottom, row), max(right, col))
+        self.frontier.discard((row, col))
+        counts, stones, frontier = self.neighbor_counts, self.stones, self.frontier
+        for cell in self._neighbors(row, col):
+            counts[cell] = counts.get(cell, 0) + 1
+            if cell not in stones:
+                frontier.add(cell)
+        values, windows, length = self.window_values, self.windows, self.win_length
+        delta = 0
+        for window in self._windows_through(row, col):
+            count = windows.get(window)
+            if count is None:
+                count = windows[window] = [0, 0]
+            x, o = count
+            if player == 'X':
+                delta += values[x + 1][o] - values[x][o]
+                count[0] = x + 1
+                if x + 1 == length:
+                    self.x_fives += 1
+            else:
+                delta += values[x][o + 1] - values[x][o]
+                count[1] = o + 1
+                if o + 1 == length:
+                    self.o_fives += 1
+        self.score += delta
+
+    def unmake(self, row, col):
+        # The bounding box is not shrunk; it may only over-cover the stones
+        player = self.stones.pop((row, col))
+        self.stone_count -= 1
+        self.key ^= cell_key(row, col, player)
+        counts, frontier = self.neighbor_counts, self.frontier
+        for cell in self._neighbors(row, col):
+            counts[cell] -= 1
+            if not counts[cell]:
+                del counts[cell]
+                frontier.discard(cell)
+        if counts.get((row, col)):
+            frontier.add((row, col))
+        values, windows, length = self.window_values, self.windows, self.win_length
+        delta = 0
+        for window in self._windows_through(row, col):
+            count = windows[window]
+            x, o = count
+            if player == 'X':
+                delta += values[x - 1][o] - values[x][o]
+                count[0] = x - 1
+                if x == length:
+                    self.x_fives -= 1
+            else:
+                delta += values[x][o - 1] - values[x][o]
+                count[1] = o - 1
+                if o == length:
+                    self.o_fives -= 1
+            if count[0] == 0 and count[1] == 0:
+                del windows[window]
+        self.score += delta
+
+    def relevant_moves(self):
+        # Same moves, in the same row-major order, as BoardState.relevant_moves
+        if self.frontier:
+            return sorted(self.frontier)
+        if not self.stone_count:
+            center = self.board_size // 2 if self.board_size is not None else 0
+            return [(center, center)]
+        if self.is_full():
+            return []
+        # Every neighbor is taken, which needs a bounded board: any empty cell
+        return [(i, j) for i in range(self.board_size) for j in range(self.board_size)
+                if (i, j) not in self.stones]
+
+    def winner(self):
+        if self.x_fives:
+            return 'X'
+        if self.o_fives:
+            return 'O'
+        return None
+
+    def evaluate(self):
+        if self.x_fives:
+            return -WIN_SCORE
+        if self.o_fives:
+            return WIN_SCORE
+        return self.score
+
+    def forcing(self, row, col):
+        # Same as BoardState.forcing
+        own, other = (0, 1) if self.stones[(row, col)] == 'X' else (1, 0)
+        need = self.win_length - 1
+        threes = set()
+        result = 0
+        for window in self._windows_through(row, col):
+            count = self.windows[window]
+            if count[other]:
+                continue
+            if count[own] == need:
+                return FORCING_FOUR
+            if count[own] == need - 1:
+                if window[2] in threes:
+                    result = FORCING_THREE
+                threes.add(window[2])
+        return result
+
+    def threat_cells(self, player, stones):
+        # Empty cells of windows holding `stones` of player's stones and none of the opponent's
+        own, other = (0, 1) if player == 'X' else (1, 0)
+        cells = set()
+        for (i, j, d), count in self.windows.items():
+            if count[own] == stones and not count[other]:
+                di, dj = DIRECTIONS[d]
+                for k in range(self.win_length):
+                    cell = (i + k * di, j + k * dj)
+                    if cell not in self.stones:
+                        cells.add(cell)
+        return cells
+
+    def threat_cells_at(self, row, col, player, stones):
+        # Same as threat_cells, for the windows through (row, col) only
+        own, other = (0, 1) if player == 'X' else (1, 0)
+        cells = set()
+        for window in self._windows_through(row, col):
+            count = self.windows.get(window)
+            if count is None or count[own] != stones or count[other]:
+                continue
+            i, j, d = window
+            di, dj = DIRECTIONS[d]
+            for k in range(self.win_length):
+                cell = (i + k * di, j + k * dj)
+                if cell not in self.stones:
+                    cells.add(cell)
+        return cells
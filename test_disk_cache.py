@@ -0,0 +1,85 @@
+import pytest
+
+from MiniMax import BoardState
+from disk_cache import DiskCache, HEADER, RECORD, WAYS
+from opening_book import SYMMETRIES
+
+SIZE = 9
+SCORES = {4: 50000, 3: 5000, 2: 500, 1: 50}
+
+
+def state_of(stones):
+    board = [['.'] * SIZE for _ in range(SIZE)]
+    for row, col, player in stones:
+        board[row][col] = player
+    return BoardState(board, SIZE, 5)
+
+
+def image(stones, transform):
+    return [transform(row, col, SIZE) + (player,) for row, col, player in stones]
+
+
+STONES = [(4, 4, 'X'), (3, 5, 'O'), (2, 2, 'X')]
+
+
+def test_lookup_under_every_symmetry(tmp_path):
+    cache = DiskCache(str(tmp_path / 'c.cache'), SIZE, 5, SCORES)
+    cache.store(state_of(STONES), 123, 4, (5, 1))
+    for transform in SYMMETRIES:
+        score, depth, move = cache.lookup(state_of(image(STONES, transform)))
+        assert (score, depth) == (123, 4)
+        assert move == transform(5, 1, SIZE)
+    cache.close()
+
+
+def test_results_survive_reopening(tmp_path):
+    path = str(tmp_path / 'c.cache')
+    cache = DiskCache(path, SIZE, 5, SCORES)
+    cache.store(state_of(STONES), -7, 3, (0, 8))
+    cache.close()
+    cache = DiskCache(path, SIZE, 5, SCORES)
+    assert cache.lookup(state_of(STONES)) == (-7, 3, (0, 8))
+    cache.close()
+
+
+def test_torn_record_reads_as_empty(tmp_path):
+    cache = DiskCache(str(tmp_path / 'c.cache'), SIZE, 5, SCORES)
+    cache.store(state_of(STONES), 123, 4, (5, 1))
+    # Damage the score of every stored record, leaving its checksum as it was
+    for offset in range(HEADER.size, len(cache.data), RECORD.size):
+        if cache._read(offset) is not None:
+            cache.data[offset + 8] ^= 0xFF
+    assert cache.lookup(state_of(STONES)) is None
+    assert cache.fill() == 0
+    cache.close()
+
+
+def test_mismatched_header_is_refused(tmp_path):
+    path = str(tmp_path / 'c.cache')
+    DiskCache(path, SIZE, 5, SCORES).close()
+    with pytest.raises(ValueError):
+        DiskCache(path, SIZE + 2, 5, SCORES)
+    with pytest.raises(ValueError):
+        DiskCache(path, SIZE, 4, SCORES)
+    with pytest.raises(ValueError):
+        DiskCache(path, SIZE, 5, {**SCORES, 4: 1})
+    other = tmp_path / 'other.cache'
+    other.write_bytes(b'\0' * (HEADER.size + RECORD.size * WAYS))
+    with pytest.raises(ValueError):
+        DiskCache(str(other), SIZE, 5, SCORES)
+
+
+def test_shallowest_record_is_replaced(tmp_path):
+    # One bucket, so every position competes for the same WAYS slots
+    cache = DiskCache(str(tmp_path / 'c.cache'), SIZE, 5, SCORES, max_bytes=HEADER.size + RECORD.size * WAYS)
+    assert cache.buckets == 1
+    states = [state_of([(0, k, 'X')]) for k in range(WAYS + 1)]
+    for depth, state in enumerate(states[:WAYS], 2):
+        cache.store(state, depth, depth, (8, 8))
+    cache.store(states[WAYS], 9, 9, (8, 8))
+    assert cache.lookup(states[0]) is None
+    assert all(cache.lookup(state) is not None for state in states[1:])
+    # A shallower result does not replace a deeper one for the same position
+    cache.store(states[WAYS], 1, 1, (7, 7))
+    assert cache.lookup(states[WAYS]) == (9, 9, (8, 8))
+    cache.close()
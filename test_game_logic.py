@@ -0,0 +1,36 @@
+import game_logic
+from game_logic import AI_move, make_engine
+from solver import Solver, solve, can_solve
+
+
+def test_minimax_mode_plays_the_solver_move_on_a_small_board(monkeypatch):
+    # Mode 2 of the console game: minimax without pruning at difficulty 3
+    board = [list(row) for row in ('XX.O.',
+                                   '.OX..',
+                                   '..XO.',
+                                   '.O.X.',
+                                   '.....')]
+    assert can_solve(board, 5)
+    calls = []
+    solve_for_move = game_logic.solve_for_move
+
+    def recording_solve_for_move(*args, **kwargs):
+        calls.append(args)
+        return solve_for_move(*args, **kwargs)
+
+    monkeypatch.setattr(game_logic, 'solve_for_move', recording_solve_for_move)
+    engine = make_engine(5, 'O', 3, use_alpha_beta=False)
+    expected = solve([row[:] for row in board], 'O', 5)[1]
+    move = AI_move(board, 'O', 3, use_alpha_beta=False, engine=engine, solver=Solver(5, 5))
+    assert len(calls) == 1
+    assert move == expected
+    assert board[move[0]][move[1]] == 'O'
+
+
+def test_mcts_mode_plays_the_book_move(monkeypatch):
+    # Mode 4 of the console game: MCTS at difficulty 3
+    board = [['.'] * 15 for _ in range(15)]
+    board[7][7] = 'X'
+    monkeypatch.setattr(game_logic, 'book_move', lambda board: (6, 8))
+    engine = make_engine(15, 'O', 3, algorithm='mcts')
+    assert AI_move(board, 'O', 3, use_alpha_beta=False, engine=engine) == (6, 8)
@@ -0,0 +1,60 @@
+from opening_book import SYMMETRIES
+from solver import Solver, solve, can_solve, count_live_cells, WIN, DRAW, LOSS, SOLVER_MAX_LIVE_CELLS
+
+
+def empty(size):
+    return [['.'] * size for _ in range(size)]
+
+
+def test_tic_tac_toe_is_a_draw():
+    assert Solver(3, 3).solve(empty(3), 'X')[0] == DRAW
+
+
+def test_first_player_wins_three_in_a_row_on_4x4():
+    outcome, move = Solver(4, 3).solve(empty(4), 'X')
+    assert outcome == WIN
+    board = empty(4)
+    board[move[0]][move[1]] = 'X'
+    # After the winning move the opponent loses whatever it plays
+    assert Solver(4, 3).solve(board, 'O')[0] == LOSS
+
+
+def test_outcome_is_the_same_under_every_symmetry():
+    board = empty(4)
+    board[0][1], board[1][1], board[2][3] = 'X', 'O', 'X'
+    outcomes = set()
+    for transform in SYMMETRIES:
+        image = empty(4)
+        for i in range(4):
+            for j in range(4):
+                r, c = transform(i, j, 4)
+                image[r][c] = board[i][j]
+        outcomes.add(Solver(4, 3).solve(image, 'O')[0])
+    assert len(outcomes) == 1
+
+
+def test_memo_carried_over_between_moves_gives_fresh_results():
+    board = empty(4)
+    solver = Solver(4, 3)
+    player = 'X'
+    for row, col in ((1, 1), (0, 0), (2, 1), (3, 1), (1, 2)):
+        assert solver.solve(board, player)[0] == Solver(4, 3).solve(board, player)[0]
+        board[row][col] = player
+        player = 'O' if player == 'X' else 'X'
+
+
+def test_solver_out_of_nodes_is_skipped_until_fewer_cells_are_live():
+    board = [list(row) for row in ('..OX.', '.O...', 'X..O.', 'O..X.', '..X..')]
+    assert count_live_cells(board, 4) <= SOLVER_MAX_LIVE_CELLS
+    assert can_solve(board, 4)
+    solver = Solver(5, 4, node_limit=10)
+    assert solve(board, 'X', 4, node_limit=10, solver=solver) == (None, None)
+    assert solver.failed_live == count_live_cells(board, 4)
+    assert not can_solve(board, 4, solver)
+    board[4][0] = 'X'
+    board[0][0] = 'O'
+    assert can_solve(board, 4, solver)
+
+
+def test_crowded_board_is_not_tried():
+    assert not can_solve(empty(15), 5)
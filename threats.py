@@ -0,0 +1,103 @@
+from functools import lru_cache
+
+# Single-pass threat scanner. Every row, column and diagonal is walked once
+# with prefix stone counts, so each win_length window (five-completing cells)
+# and each win_length + 1 window with empty ends (open fours and open threes)
+# is checked in constant time.
+
+# Threat ranks, most urgent first, from the scanning player's point of view
+WIN, BLOCK_WIN, OPEN_FOUR, BLOCK_OPEN_FOUR, OPEN_THREE, BLOCK_OPEN_THREE = range(6)
+RANK_NAMES = ('win', 'block win', 'open four', 'block open four', 'open three', 'block open three')
+
+# Kinds of cells found for each side: completes a line, makes an open four, makes an open three
+FIVE, FOUR, THREE = range(3)
+
+
+@lru_cache(maxsize=None)
+def board_lines(rows, cols, win_length):
+    # Cell lists of every row, column and diagonal long enough to hold a line
+    lines = [[(i, j) for j in range(cols)] for i in range(rows)]
+    lines += [[(i, j) for i in range(rows)] for j in range(cols)]
+    for start in range(-(rows - 1), cols):
+        lines.append([(i, i + start) for i in range(rows) if 0 <= i + start < cols])
+        lines.append([(i, start + rows - 1 - i) for i in range(rows) if 0 <= start + rows - 1 - i < cols])
+    return tuple(tuple(line) for line in lines if len(line) >= win_length)
+
+
+class ThreatScan:
+    def __init__(self, player):
+        self.player = player
+        # side -> kind -> {cell: how many windows make the threat there}
+        self.cells = {'X': ({}, {}, {}), 'O': ({}, {}, {})}
+
+    def add(self, side, kind, cell):
+        found = self.cells[side][kind]
+        found[cell] = found.get(cell, 0) + 1
+
+    def ranked(self, player=None):
+        # [(cell, rank)] for `player` (the scanning player by default), most
+        # urgent first; a cell hit by more threats wins a tie of ranks
+        player = self.player if player is None else player
+        opponent = 'O' if player == 'X' else 'X'
+        best = {}
+        for rank, (side, kind) in enumerate(((player, FIVE), (opponent, FIVE), (player, FOUR),
+                                             (opponent, FOUR), (player, THREE), (opponent, THREE))):
+            for cell, hits in self.cells[side][kind].items():
+                rank_hits = best.get(cell)
+                if rank_hits is None:
+                    best[cell] = [rank, hits]
+                elif rank_hits[0] == rank:
+                    rank_hits[1] += hits
+        ordered = sorted(best.items(), key=lambda item: (item[1][0], -item[1][1], item[0]))
+        return [(cell, rank) for cell, (rank, _) in ordered]
+
+    def best(self, player=None):
+        ranked = self.ranked(player)
+        return ranked[0][0] if ranked else None
+
+    def wins(self, player=None):
+        return set(self.cells[self.player if player is None else player][FIVE])
+
+
+def scan_threats(board, player, win_length=5):
+    # Threats of both sides on a list board; `player` is the side to move
+    scan = ThreatScan(player)
+    length = win_length
+    for line in board_lines(len(board), len(board[0]), win_length):
+        values = [board[i][j] for i, j in line]
+        xs = [0]
+        os = [0]
+        for value in values:
+            xs.append(xs[-1] + (value == 'X'))
+            os.append(os[-1] + (value == 'O'))
+        n = len(values)
+        for start in range(n - length + 1):
+            end = start + length
+            x = xs[end] - xs[start]
+            o = os[end] - os[start]
+            if x == length - 1 and not o:
+                _add_empty(scan, 'X', FIVE, line, values, start, end)
+            elif o == length - 1 and not x:
+                _add_empty(scan, 'O', FIVE, line, values, start, end)
+            # The open window: this window plus the next cell, both ends empty
+            if end == n or values[start] != '.' or values[end] != '.':
+                continue
+            x = xs[end] - xs[start + 1]
+            o = os[end] - os[start + 1]
+            if o == 0 and x:
+                if x == length - 2:
+                    _add_empty(scan, 'X', FOUR, line, values, start + 1, end)
+                elif x == length - 3:
+                    _add_empty(scan, 'X', THREE, line, values, start + 1, end)
+            elif x == 0 and o:
+                if o == length - 2:
+                    _add_empty(scan, 'O', FOUR, line, values, start + 1, end)
+                elif o == length - 3:
+                    _add_empty(scan, 'O', THREE, line, values, start + 1, end)
+    return scan
+
+
+def _add_empty(scan, side, kind, line, values, start, end):
+    for k in range(start, end):
+        if values[k] == '.':
+            scan.add(side, kind, line[k])
@@ -0,0 +1,186 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from MiniMax import Engine, Selectivity, check_win_from, get_relevant_moves
+
+ENGINES = ['alphabeta', 'minimax']
+DEFAULT_CONFIG = {'engine': 'alphabeta', 'depth': 3, 'time_ms': 1000, 'radius': 1, 'scores': None,
+                  'widths': None, 'lmr': None, 'four_ext': 0, 'three_ext': 0}
+
+
+def parse_engine(spec):
+    # "name=fast,engine=alphabeta,depth=4,time_ms=500,scores=50000/5000/500/50";
+    # scores are the values of 4, 3, 2 and 1 stones in a window. Selective
+    # search: widths=12/8/6 (candidates per ply), lmr=3 (full-depth moves
+    # before reductions), four_ext=1 and three_ext=1 (extension plies)
+    config = dict(DEFAULT_CONFIG)
+    for item in spec.split(','):
+        key, _, value = item.partition('=')
+        if key == 'scores':
+            values = [float(v) for v in value.split('/')]
+            config['scores'] = {count: score for count, score in zip((4, 3, 2, 1), values)}
+        elif key == 'widths':
+            config['widths'] = [int(v) for v in value.split('/')]
+        elif key in ('depth', 'time_ms', 'radius', 'lmr', 'four_ext', 'three_ext'):
+            config[key] = int(value)
+        elif key in ('name', 'engine'):
+            config[key] = value
+        else:
+            raise ValueError(f"unknown engine option {key!r}")
+    if config['engine'] not in ENGINES:
+        raise ValueError(f"unknown engine {config['engine']!r}")
+    config.setdefault('name', f"{config['engine']}-d{config['depth']}")
+    return config
+
+
+def make_engine(config, board_size, player):
+    selectivity = None
+    if config['widths'] or config['lmr'] is not None or config['four_ext'] or config['three_ext']:
+        selectivity = Selectivity(config['widths'], config['lmr'], four_extension=config['four_ext'],
+                                  three_extension=config['three_ext'])
+    return Engine(board_size, player=player, algorithm=config['engine'], max_depth=config['depth'],
+                  time_limit_ms=config['time_ms'], scores=config['scores'], radius=config['radius'],
+                  selectivity=selectivity)
+
+
+def play_game(game, x_config, o_config, board_size, opening_plies, seed):
+    # One game in a worker process; the first opening_plies moves are random
+    # nearby moves so repeated pairings do not replay the same game
+    rng = random.Random(seed)
+    board = [['.'] * board_size for _ in range(board_size)]
+    configs = {'X': x_config, 'O': o_config}
+    engines = {player: make_engine(configs[player], board_size, player) for player in configs}
+    times = {'X': [], 'O': []}
+    moves = []
+    player, winner = 'X', None
+    # An engine that fails to move (no move, or an error) forfeits the game
+    forfeit, error = None, None
+    for ply in range(board_size * board_size):
+        if ply < opening_plies:
+            move = rng.choice(get_relevant_moves(board, board_size))
+        else:
+            start = time.perf_counter()
+            try:
+                move = engines[player].best_move(board)
+            except Exception as e:
+                move, error = None, f"{type(e).__name__}: {e}"
+            times[player].append(time.perf_counter() - start)
+            if move is None:
+                forfeit = player
+                winner = 'O' if player == 'X' else 'X'
+                break
+        row, col = move
+        board[row][col] = player
+        moves.append([row, col])
+        if check_win_from(board, row, col):
+            winner = player
+            break
+        player = 'O' if player == 'X' else 'X'
+    return {
+        'game': game,
+        'board_size': board_size,
+        'x': x_config['name'],
+        'o': o_config['name'],
+        'winner': winner,
+        'winner_engine': configs[winner]['name'] if winner else None,
+        'forfeit': configs[forfeit]['name'] if forfeit else None,
+        'error': error,
+        'moves': moves,
+        'move_times': {p: [round(t, 4) for t in times[p]] for p in times},
+    }
+
+
+def wilson_interval(score, games, z=1.96):
+    # Wilson score interval for a win rate; draws count as half a win
+    if games == 0:
+        return 0.0, 1.0
+    p = score / games
+    denominator = 1 + z * z / games
+    center = (p + z * z / (2 * games)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def schedule(configs, games, board_size, opening_plies, seed):
+    # Every pair of engines plays `games` games, alternating who has X
+    jobs = []
+    for a, b in itertools.combinations(configs, 2):
+        for k in range(games):
+            x_config, o_config = (a, b) if k % 2 == 0 else (b, a)
+            jobs.append((len(jobs), x_config, o_config, board_size, opening_plies, seed + len(jobs)))
+    return jobs
+
+
+def run_tournament(configs, games, board_size, opening_plies, seed, workers, out):
+    # Plays the schedule over a process pool, writing each game to `out` as a
+    # JSON line as soon as it finishes
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_game, *job) for job in schedule(configs, games, board_size,
+                                                                         opening_plies, seed)]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    return results
+
+
+def summarize(configs, results):
+    lines = []
+    for a, b in itertools.combinations(configs, 2):
+        pair = [r for r in results if {r['x'], r['o']} == {a['name'], b['name']}]
+        wins = sum(1 for r in pair if r['winner_engine'] == a['name'])
+        losses = sum(1 for r in pair if r['winner_engine'] == b['name'])
+        draws = len(pair) - wins - losses
+        low, high = wilson_interval(wins + draws / 2, len(pair))
+        rate = (wins + draws / 2) / len(pair) if pair else 0.0
+        lines.append(f"{a['name']} vs {b['name']}: +{wins} -{losses} ={draws}  "
+                     f"score {rate:.1%} (95% CI {low:.1%} - {high:.1%})")
+    for config in configs:
+        times = [t for r in results for p in ('X', 'O') if r[p.lower()] == config['name']
+                 for t in r['move_times'][p]]
+        average = sum(times) / len(times) if times else 0.0
+        forfeits = sum(1 for r in results if r.get('forfeit') == config['name'])
+        lines.append(f"{config['name']}: {len(times)} moves, {average * 1000:.1f} ms per move, "
+                     f"{forfeits} forfeits")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless Gomoku self-play tournament")
+    parser.add_argument("--engine", action="append", required=True,
+                        help="engine spec, e.g. name=d3,engine=alphabeta,depth=3,time_ms=1000,"
+                             "scores=50000/5000/500/50 (give at least two)")
+    parser.add_argument("--games", type=int, default=20, help="games per pair of engines")
+    parser.add_argument("--size", type=int, default=15)
+    parser.add_argument("--opening-plies", type=int, default=2, help="random moves at the start of each game")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", help="write game records here instead of stdout")
+    args = parser.parse_args()
+
+    try:
+        configs = [parse_engine(spec) for spec in args.engine]
+    except ValueError as e:
+        parser.error(str(e))
+    if len(configs) < 2:
+        parser.error("need at least two engines")
+    names = [config['name'] for config in configs]
+    if len(set(names)) != len(names):
+        parser.error("engine names must be unique")
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        results = run_tournament(configs, args.games, args.size, args.opening_plies, args.seed, args.workers, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(summarize(configs, results), file=sys.stderr)
@@ -0,0 +1,95 @@
+# Victory by continuous fours (VCF): the attacker plays only moves that make a
+# four, so every defender reply is forced, and the tree stays narrow even when
+# the win is many moves deep. Works on a MiniMax.BoardState or sparse.SparseBoard.
+#
+# Only the root scans every window. Below it the threats change only through
+# the stones just played, so each node reads the windows through those.
+
+VCF_NODE_LIMIT = 2000
+
+
+class VCFBudgetExceeded(Exception):
+    pass
+
+
+def winning_cells(state, player):
+    # Empty cells where `player` would complete a line right now
+    return sorted(state.threat_cells(player, state.win_length - 1))
+
+
+def four_moves(state, player):
+    # Empty cells where `player` would make a four (a line one move from five)
+    return sorted(state.threat_cells(player, state.win_length - 2))
+
+
+class _VCFSearch:
+    def __init__(self, state, attacker, node_limit, ctx=None):
+        self.state = state
+        self.attacker = attacker
+        self.defender = 'O' if attacker == 'X' else 'X'
+        self.node_limit = node_limit
+        # A MiniMax.SearchContext whose tick() stops the search at its
+        # deadline or cancellation
+        self.ctx = ctx
+        self.nodes = 0
+        # Positions (attacker to move) already shown not to have a VCF
+        self.failed = set()
+
+    def root(self):
+        state = self.state
+        wins = winning_cells(state, self.attacker)
+        if wins:
+            return wins[0]
+        # A defender four must be answered, which breaks the chain of fours
+        if winning_cells(state, self.defender):
+            return None
+        return self.attack(set(four_moves(state, self.attacker)))
+
+    def attack(self, candidates):
+        # The attacker has no winning cell here and the defender none either.
+        # `candidates` holds every empty cell that makes a four, plus cells
+        # that may no longer do so; playing a cell shows which it is.
+        self.nodes += 1
+        if self.nodes > self.node_limit:
+            raise VCFBudgetExceeded()
+        if self.ctx is not None:
+            self.ctx.tick()
+        state = self.state
+        if state.key in self.failed:
+            return None
+        need = state.win_length - 1
+        for row, col in sorted(candidates):
+            state.make(row, col, self.attacker)
+            try:
+                # The attacker had no winning cell, so any now run through this stone
+                threats = state.threat_cells_at(row, col, self.attacker, need)
+                if len(threats) >= 2:
+                    # Open four (or double four): cannot be blocked
+                    return (row, col)
+                if len(threats) == 1:
+                    block_row, block_col = threats.pop()
+                    state.make(block_row, block_col, self.defender)
+                    try:
+                        # A four made by the block must be answered
+                        if not state.threat_cells_at(block_row, block_col, self.defender, need):
+                            added = state.threat_cells_at(row, col, self.attacker, need - 1)
+                            following = (candidates | added) - {(row, col), (block_row, block_col)}
+                            if self.attack(following) is not None:
+                                return (row, col)
+                    finally:
+                        state.unmake(block_row, block_col)
+            finally:
+                state.unmake(row, col)
+        self.failed.add(state.key)
+        return None
+
+
+def find_vcf(state, attacker, node_limit=VCF_NODE_LIMIT, ctx=None):
+    # First move of a forced win by continuous fours for `attacker` (who is to
+    # move), or None if none is found within node_limit nodes. With a
+    # SearchContext, its SearchTimeout or SearchCancelled propagates.
+    search = _VCFSearch(state, attacker, node_limit, ctx)
+    try:
+        return search.root()
+    except VCFBudgetExceeded:
+        return None
@@ -0,0 +1,73 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Cell encoding of the int8 board array
+EMPTY, X_STONE, O_STONE = 0, -1, 1
+CELL_CODES = {'.': EMPTY, 'X': X_STONE, 'O': O_STONE}
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+
+def numpy_available():
+    return np is not None
+
+
+def board_to_array(board):
+    return np.array([[CELL_CODES[cell] for cell in row] for row in board], dtype=np.int8)
+
+
+def value_array(window_values):
+    # A [x_count][o_count] window value table as an array, with one spare
+    # row/column so "count + 1" can be indexed for every window
+    size = len(window_values)
+    values = np.zeros((size + 1, size + 1))
+    values[:size, :size] = window_values
+    return values
+
+
+def _window_slices(board_size, win_length, di, dj):
+    # For each offset k along the line, the block of cells that is the k-th
+    # cell of every window in direction (di, dj)
+    rows = board_size - (win_length - 1) * di
+    cols = board_size - (win_length - 1) * abs(dj)
+    col_start = (win_length - 1) if dj < 0 else 0
+    return [(slice(k * di, k * di + rows), slice(col_start + k * dj, col_start + k * dj + cols))
+            for k in range(win_length)]
+
+
+def batch_evaluate_moves(cells, moves, player, values, win_score, win_length=5):
+    # Board evaluation after playing each move, for all moves in one pass.
+    # `cells` is the int8 board array and `values` comes from value_array;
+    # returns one score per move.
+    board_size = cells.shape[0]
+    x_cells = (cells == X_STONE).astype(np.int8)
+    o_cells = (cells == O_STONE).astype(np.int8)
+    base = 0.0
+    delta = np.zeros(cells.shape)
+    makes_five = np.zeros(cells.shape, dtype=bool)
+    for di, dj in DIRECTIONS:
+        slices = _window_slices(board_size, win_length, di, dj)
+        if slices[0][0].stop <= slices[0][0].start or slices[0][1].stop <= slices[0][1].start:
+            continue
+        # Sliding-window stone counts for every window start
+        x_count = sum(x_cells[s] for s in slices).astype(np.intp)
+        o_count = sum(o_cells[s] for s in slices).astype(np.intp)
+        current = values[x_count, o_count]
+        base += current.sum()
+        # Change of each window's value if the player adds a stone to it
+        if player == 'X':
+            window_delta = values[x_count + 1, o_count] - current
+            window_five = (x_count + 1 == win_length) & (o_count == 0)
+        else:
+            window_delta = values[x_count, o_count + 1] - current
+            window_five = (o_count + 1 == win_length) & (x_count == 0)
+        # Scatter window changes back onto the cells each window covers
+        for s in slices:
+            delta[s] += window_delta
+            makes_five[s] |= window_five
+    rows = np.fromiter((move[0] for move in moves), dtype=np.intp, count=len(moves))
+    cols = np.fromiter((move[1] for move in moves), dtype=np.intp, count=len(moves))
+    result = base + delta[rows, cols]
+    result[makes_five[rows, cols]] = -win_score if player == 'X' else win_score
+    return result